@@ -0,0 +1,273 @@
+import argparse
+import contextlib
+import glob
+import gzip
+import io
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from botSubito import CONFIG_FILE, DEFAULT_CONFIG, PriceMonitor
+
+# Pagine salvate usate come corpus predefinito
+DEFAULT_CORPUS = ["subito_debug.html", "test_page.html"]
+
+# Metriche per cui un valore più alto è migliore (le altre sono costi)
+HIGHER_IS_BETTER = {"pages_per_sec", "cards_per_sec", "cycles_per_sec"}
+
+# Carica le pagine del corpus da file .html, snapshot .html.gz o directory di snapshot
+def load_corpus(paths):
+    pages = []
+    for path in paths:
+        files = sorted(glob.glob(os.path.join(path, "*.html*"))) if os.path.isdir(path) else [path]
+        for file_path in files:
+            if file_path.endswith(".gz"):
+                with gzip.open(file_path, "rt", encoding="utf-8") as f:
+                    pages.append((file_path, f.read()))
+            else:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    pages.append((file_path, f.read()))
+    return pages
+
+# Configurazione del monitor isolata: niente database, archivio, cache o scansione incrementale
+def benchmark_config(requests_per_second=1000.0, parse_workers=0, embedded_json=True):
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, "r") as f:
+            config.update(json.load(f))
+    
+    config["database"] = {"enabled": False}
+    config["snapshots"] = {"enabled": False}
+    config["incremental"] = {"enabled": False}
+    config["cache"] = {"enabled": False}
+    config["parser"] = {**config.get("parser", {}), "embedded_json": embedded_json}
+    config["parse_pool"] = {**config.get("parse_pool", {}), "enabled": parse_workers > 0, "workers": parse_workers}
+    config["http"] = {**config.get("http", {}), "conditional_requests": False}
+    config["rate_limit"] = {
+        **config.get("rate_limit", {}),
+        "requests_per_second": requests_per_second,
+        "burst": 100,
+        "max_rate": requests_per_second,
+        "backoff_base": 0.05,
+        "backoff_max": 0.5
+    }
+    return config
+
+def bench_parse(monitor, corpus, product_name, repeat):
+    # Prima passata misurata senza tracemalloc, che rallenterebbe il parsing
+    # Con il pool di parsing attivo le pagine vengono distribuite tra i processi
+    pages = [(html_content, product_name, 1) for _, html_content in corpus]
+    if monitor.parse_pool:
+        monitor.parse_many(pages)  # Avvio dei worker escluso dalla misura
+    
+    start = time.perf_counter()
+    cards = sum(len(products) for products in monitor.parse_many(pages * repeat))
+    elapsed = time.perf_counter() - start
+    
+    # Seconda passata per il picco di memoria (del solo processo principale)
+    tracemalloc.start()
+    monitor.parse_many(pages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    pages = repeat * len(corpus)
+    return {
+        "workers": monitor.parse_pool._max_workers if monitor.parse_pool else 0,
+        "pages": pages,
+        "cards": cards,
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(pages / elapsed, 2),
+        "cards_per_sec": round(cards / elapsed, 2),
+        "peak_memory_kb": round(peak / 1024, 1)
+    }
+
+# Server locale che imita le pagine di ricerca di Subito con il parametro ?o=N.
+# Gli errori iniettati (le prime fail_first richieste, poi con probabilità
+# error_rate) rispondono con error_status e, se indicato, l'header Retry-After.
+class StandInServer:
+    def __init__(self, corpus, latency=0.0, error_rate=0.0, seed=0, fail_first=0, error_status=503, retry_after=None):
+        self.corpus = [html_content.encode("utf-8") for _, html_content in corpus]
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+    
+    def _make_handler(self):
+        stand_in = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_GET(self):
+                page = int(parse_qs(urlparse(self.path).query).get("o", ["1"])[0])
+                with stand_in._lock:
+                    stand_in.requests += 1
+                    fail = stand_in.requests <= stand_in.fail_first or stand_in.random.random() < stand_in.error_rate
+                    if fail:
+                        stand_in.errors += 1
+                
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                
+                if fail:
+                    self.send_response(stand_in.error_status)
+                    if stand_in.retry_after is not None:
+                        self.send_header("Retry-After", str(stand_in.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                
+                body = stand_in.corpus[(page - 1) % len(stand_in.corpus)]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+def bench_fetch(monitor, corpus, product_name, pages, cycles, latency, error_rate):
+    with StandInServer(corpus, latency=latency, error_rate=error_rate) as server:
+        search_config = {
+            "product_name": product_name,
+            "search_url": f"{server.base_url}/annunci-italia/vendita/usato/?q={product_name.replace(' ', '+')}",
+            "min_price": 0,
+            "max_price": 1000000,
+            "results_limit": 1000,
+            "pages_to_check": pages
+        }
+        
+        products = 0
+        start = time.perf_counter()
+        for _ in range(cycles):
+            # Il risultato viene stampato da check_prices: lo scartiamo
+            with contextlib.redirect_stdout(io.StringIO()):
+                products += len(monitor.check_prices(search_config))
+        elapsed = time.perf_counter() - start
+        
+        return {
+            "cycles": cycles,
+            "pages": pages * cycles,
+            "requests": server.requests,
+            "injected_errors": server.errors,
+            "products": products,
+            "seconds": round(elapsed, 4),
+            "cycles_per_sec": round(cycles / elapsed, 3),
+            "pages_per_sec": round(pages * cycles / elapsed, 2)
+        }
+
+# Confronta i risultati con quelli salvati e restituisce le regressioni trovate
+def compare_with_baseline(results, baseline, tolerance):
+    regressions = []
+    for section, metrics in results.items():
+        for name, value in metrics.items():
+            old = baseline.get(section, {}).get(name)
+            if not isinstance(value, (int, float)) or not old or name not in HIGHER_IS_BETTER | {"peak_memory_kb"}:
+                continue
+            
+            change = (value - old) / old
+            worse = change < -tolerance if name in HIGHER_IS_BETTER else change > tolerance
+            status = "REGRESSIONE" if worse else "ok"
+            print(f"  {section}.{name}: {old} -> {value} ({change:+.1%}) {status}")
+            if worse:
+                regressions.append(f"{section}.{name}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline del parser e del recupero pagine di Subito.it')
+    parser.add_argument('--corpus', nargs='+', default=DEFAULT_CORPUS, help='File HTML o directory di snapshot da usare come corpus')
+    parser.add_argument('--product', default='iphone 13', help='Nome del prodotto usato per il filtro di pertinenza')
+    parser.add_argument('--repeat', type=int, default=20, help='Ripetizioni del corpus nel benchmark di parsing')
+    parser.add_argument('--pages', type=int, default=10, help='Pagine per ciclo nel benchmark end-to-end')
+    parser.add_argument('--cycles', type=int, default=3, help='Cicli di check_prices nel benchmark end-to-end')
+    parser.add_argument('--latency', type=float, default=0.05, help='Latenza simulata del server locale in secondi')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Frazione di richieste a cui il server risponde 503')
+    parser.add_argument('--workers', type=int, default=0, help='Processi del pool di parsing (0 per analizzare nel processo principale)')
+    parser.add_argument('--dom', action='store_true', help="Ignora il JSON incorporato e misura l'analisi dell'HTML")
+    parser.add_argument('--skip-fetch', action='store_true', help='Esegui solo il benchmark di parsing')
+    parser.add_argument('--save-baseline', metavar='FILE', help='Salva i risultati come riferimento')
+    parser.add_argument('--baseline', metavar='FILE', help='Confronta i risultati con un riferimento salvato')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Variazione massima accettata rispetto al riferimento')
+    parser.add_argument('--verbose', action='store_true', help='Mostra i log del monitor')
+    
+    args = parser.parse_args()
+    
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+    
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print("Nessuna pagina trovata nel corpus")
+        return 1
+    
+    monitor = PriceMonitor(benchmark_config(parse_workers=args.workers, embedded_json=not args.dom))
+    results = {}
+    
+    try:
+        print(f"Corpus: {len(corpus)} pagine, motore di parsing: {monitor.parser_engine}")
+        results["parse"] = bench_parse(monitor, corpus, args.product, args.repeat)
+        print(f"Parsing: {json.dumps(results['parse'])}")
+        
+        if not args.skip_fetch:
+            results["fetch"] = bench_fetch(monitor, corpus, args.product, args.pages, args.cycles, args.latency, args.error_rate)
+            print(f"Recupero end-to-end: {json.dumps(results['fetch'])}")
+    finally:
+        if monitor.parse_pool:
+            monitor.parse_pool.shutdown()
+    
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Riferimento salvato in {args.save_baseline}")
+    
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        print(f"Confronto con {args.baseline} (tolleranza {args.tolerance:.0%}):")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressioni: {', '.join(regressions)}")
+            return 1
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# Misura le prestazioni e salva un riferimento
+# python3 benchmark.py --save-baseline bench_baseline.json
+
+# Misura la scalabilità del parsing su più processi
+# python3 benchmark.py --skip-fetch --workers 8 --dom
+
+# Controlla le regressioni con latenza e errori simulati
+# python3 benchmark.py --baseline bench_baseline.json --latency 0.1 --error-rate 0.05
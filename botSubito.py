@@ -1,22 +1,172 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, NavigableString
+from bs4.builder import builder_registry
 import time
 import json
 import logging
+import logging.handlers
 import os
-import schedule
+import sys
 import re
-from urllib.parse import quote_plus
-
-# Configurazione del logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("price_monitor.log"),
-        logging.StreamHandler()
-    ]
-)
+import io
+import heapq
+import itertools
+import random
+import gzip
+import hashlib
+import shutil
+import atexit
+import cProfile
+import pstats
+import signal
+import smtplib
+import queue
+import sqlite3
+import threading
+from collections import Counter, OrderedDict, deque
+from array import array
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qsl, quote_plus, urlencode, urlparse, urlunparse
+
+# Le statistiche di mercato richiedono numpy, che è opzionale
+try:
+    import price_analytics
+except ImportError:
+    price_analytics = None
+
+# Impostazioni predefinite del logging
+DEFAULT_LOGGING_CONFIG = {
+    "level": "INFO",
+    "file": "price_monitor.log",   # None per non scrivere su file
+    "console": True,
+    "format": "text",              # "text" oppure "json" (una riga JSON per messaggio, solo nel file)
+    "max_bytes": 10 * 1024 * 1024, # Rotazione per dimensione (0 per disattivarla)
+    "when": None,                  # Rotazione a tempo al posto di quella per dimensione, es. "midnight"
+    "backup_count": 5,
+    "compress": True,              # Comprime con gzip i file ruotati
+    "rate_limit_burst": 20,        # Messaggi INFO/DEBUG ammessi per riga di codice in ogni intervallo (0 per disattivare)
+    "rate_limit_interval_seconds": 60
+}
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Campi strutturati passati con extra={...} e riportati nel formato JSON
+LOG_FIELDS = ("search", "page", "duration")
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+# Limita i messaggi ripetitivi (ad esempio quelli emessi per ogni pagina): ogni
+# riga di codice può produrre al più burst messaggi INFO/DEBUG per intervallo;
+# il primo messaggio dell'intervallo successivo riporta quanti sono stati scartati.
+# Avvisi ed errori passano sempre.
+class LogRateLimitFilter(logging.Filter):
+    def __init__(self, burst, interval_seconds):
+        super().__init__()
+        self.burst = burst
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._windows = {}    # (file, riga) -> [inizio intervallo, messaggi, scartati]
+    
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval_seconds:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+            else:
+                window[1] += 1
+                if window[1] > self.burst:
+                    window[2] += 1
+                    return False
+                return True
+        
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} messaggi simili soppressi)"
+            record.args = None
+        return True
+
+_log_listener = None
+
+def _stop_logging():
+    # Scrive i messaggi ancora in coda e chiude i file
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+atexit.register(_stop_logging)
+
+def _gzip_rotated_log(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+# Configura il logging: i thread di scansione accodano soltanto i messaggi,
+# mentre un thread dedicato li formatta e li scrive su file e console
+def setup_logging(config=None):
+    config = {**DEFAULT_LOGGING_CONFIG, **(config or {})}
+    text_formatter = logging.Formatter(LOG_FORMAT)
+    
+    handlers = []
+    if config["file"]:
+        if config["when"]:
+            file_handler = logging.handlers.TimedRotatingFileHandler(config["file"], when=config["when"], backupCount=config["backup_count"], encoding="utf-8")
+        else:
+            file_handler = logging.handlers.RotatingFileHandler(config["file"], maxBytes=config["max_bytes"], backupCount=config["backup_count"], encoding="utf-8")
+        if config["compress"]:
+            file_handler.namer = lambda name: name + ".gz"
+            file_handler.rotator = _gzip_rotated_log
+        file_handler.setFormatter(JsonLogFormatter() if config["format"] == "json" else text_formatter)
+        handlers.append(file_handler)
+    if config["console"]:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(text_formatter)
+        handlers.append(console_handler)
+    
+    # Coda illimitata: chi registra un messaggio non attende mai la scrittura
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if config["rate_limit_burst"]:
+        queue_handler.addFilter(LogRateLimitFilter(config["rate_limit_burst"], config["rate_limit_interval_seconds"]))
+    
+    global _log_listener
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    _stop_logging()
+    
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    root.addHandler(queue_handler)
+    root.setLevel(config["level"])
+    return _log_listener
 
 # Configurazione
 CONFIG_FILE = "config.json"
@@ -27,409 +177,2968 @@ DEFAULT_CONFIG = {
     "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 }
 
-class PriceMonitor:
+# Impostazioni predefinite per il recupero delle pagine
+DEFAULT_HTTP_CONFIG = {
+    "concurrent": True,               # Scarica in parallelo le pagine di una ricerca
+    "max_concurrency_per_host": 4,    # Richieste contemporanee massime verso lo stesso host
+    "pool_size": 10,                  # Connessioni mantenute aperte per ogni host
+    "timeout": 30,                    # Timeout in secondi per ogni richiesta
+    "conditional_requests": True      # Usa ETag/Last-Modified per evitare di riscaricare pagine invariate
+}
+
+# Impostazioni predefinite per la limitazione adattiva delle richieste
+DEFAULT_RATE_LIMIT_CONFIG = {
+    "requests_per_second": 4.0,   # Velocità iniziale per host
+    "burst": 4,                   # Richieste consecutive consentite senza attesa
+    "min_rate": 0.2,              # Velocità minima raggiungibile dopo errori 429/5xx
+    "max_rate": 8.0,              # Velocità massima raggiungibile in assenza di errori
+    "adaptive": True,             # Adatta la velocità agli errori osservati
+    "max_retries": 3,             # Tentativi aggiuntivi per 429, 5xx e timeout
+    "backoff_base": 1.0,          # Attesa base in secondi per il backoff esponenziale
+    "backoff_max": 60.0           # Attesa massima in secondi tra due tentativi
+}
+
+# Codici HTTP per cui ha senso ritentare la richiesta
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Impostazioni predefinite per la pianificazione delle ricerche
+DEFAULT_SCHEDULER_CONFIG = {
+    "max_workers": 4,        # Ricerche eseguite in parallelo
+    "jitter_seconds": 30     # Sfasamento casuale massimo tra ricerche con lo stesso intervallo
+}
+
+# Impostazioni predefinite per metriche e profilazione
+DEFAULT_METRICS_CONFIG = {
+    "enabled": False,                 # Avvia l'endpoint HTTP /metrics
+    "host": "127.0.0.1",
+    "port": 9108,
+    "summary_interval_seconds": 300,  # Ogni quanto scrivere il riepilogo JSON (0 per disattivarlo)
+    "summary_file": None,             # File JSON-lines opzionale per i riepiloghi
+    "profile_directory": "profiles"   # Dove salvare i profili cProfile dei cicli
+}
+
+# Limiti superiori dei bucket degli istogrammi
+HISTOGRAM_BUCKETS = {
+    "subito_fetch_seconds": [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+    "subito_fetch_bytes": [10000, 50000, 100000, 250000, 500000, 1000000, 2500000],
+    "subito_parse_seconds": [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+    "subito_search_cycle_seconds": [0.5, 1, 2.5, 5, 10, 30, 60, 120, 300],
+    "subito_schedule_lag_seconds": [0.1, 0.5, 1, 5, 10, 30, 60, 300]
+}
+DEFAULT_HISTOGRAM_BUCKETS = [0.01, 0.1, 1, 10, 100]
+
+# Impostazioni predefinite per l'invio delle notifiche
+DEFAULT_NOTIFICATION_CONFIG = {
+    "enabled": False,             # Invia notifiche per annunci nuovi o ribassati
+    "batch_window_seconds": 5,    # Attesa per raggruppare più risultati in un solo messaggio
+    "queue_size": 1000,           # Eventi in attesa per canale prima di scartarne di nuovi
+    "max_retries": 3,             # Tentativi aggiuntivi per ogni messaggio
+    "backoff_base": 2.0,          # Attesa base in secondi per il backoff esponenziale
+    "backoff_max": 120.0,         # Attesa massima in secondi tra due tentativi
+    "timeout": 15                 # Timeout in secondi per ogni invio
+}
+
+# Impostazioni predefinite per il parsing su più processi
+DEFAULT_PARSE_POOL_CONFIG = {
+    "enabled": False,             # Analizza le pagine in un pool di processi invece che nei thread
+    "workers": 0,                 # Processi del pool (0 = numero di core)
+    "chunk_size": 4,              # Pagine inviate insieme a un worker nelle analisi in blocco
+    "max_tasks_per_child": 200    # Pagine analizzate da un worker prima di essere sostituito
+}
+
+# Impostazioni predefinite per le destinazioni dei risultati
+DEFAULT_OUTPUT_CONFIG = {
+    "console": True,      # Stampa i risultati più economici a fine ciclo
+    "jsonl_file": None    # File JSON-lines a cui aggiungere ogni prodotto nel range appena trovato
+}
+
+# Statistiche di mercato e punteggio di convenienza dei nuovi annunci (richiede numpy)
+DEFAULT_ANALYTICS_CONFIG = {
+    "enabled": True,
+    "window_days": 7,     # Finestra della distribuzione dei prezzi di ogni ricerca
+    "min_listings": 10,   # Annunci minimi nella finestra per calcolare il punteggio
+    "deal_threshold": 0.8 # Punteggio minimo perché un annuncio nuovo sia segnalato come conveniente
+}
+
+# Impostazioni predefinite per la cache condivisa di pagine e prodotti
+DEFAULT_CACHE_CONFIG = {
+    "enabled": True,
+    "ttl_seconds": 120,   # Durata di validità di una pagina scaricata
+    "max_pages": 100,     # Pagine HTML mantenute in memoria
+    "max_parsed": 500     # Liste di prodotti analizzati mantenute in memoria
+}
+
+# Impostazioni predefinite per la scansione incrementale delle pagine
+DEFAULT_INCREMENTAL_CONFIG = {
+    "enabled": False,          # Interrompe la paginazione quando non ci sono annunci nuovi
+    "min_new_fraction": 0.0,   # Frazione minima di annunci nuovi per passare alla pagina successiva
+    "full_sweep_every": 6,     # Ogni quanti cicli eseguire comunque una scansione completa
+    "batch_pages": 2           # Pagine scaricate insieme dopo la prima, finché portano annunci nuovi
+}
+
+# Impostazioni predefinite per la verifica degli annunci venduti sulla pagina di dettaglio
+DEFAULT_SOLD_VERIFICATION_CONFIG = {
+    "enabled": False,
+    "max_workers": 4,                # Pagine di dettaglio scaricate contemporaneamente
+    "ttl_seconds": 21600,            # Per quanto tempo un annuncio verificato disponibile non viene riscaricato
+    "recheck_interval_minutes": 30,  # Ogni quanto ricontrollare gli annunci con verifica scaduta
+    "recheck_batch": 20,             # Annunci ricontrollati al massimo a ogni giro
+    "max_entries": 20000             # Annunci tenuti in memoria con il loro stato
+}
+
+# Impostazioni predefinite per l'archivio delle pagine scaricate
+DEFAULT_SNAPSHOT_CONFIG = {
+    "enabled": False,
+    "directory": "snapshots",
+    "mode": "empty",               # "empty": solo pagine senza annunci, "all": tutte le pagine
+    "max_bytes": 50 * 1024 * 1024, # Dimensione massima dell'archivio compresso
+    "max_files": 500               # Numero massimo di pagine conservate
+}
+
+# Motori di parsing HTML supportati, dal più veloce al più lento.
+# 'html.parser' è puro Python e resta sempre disponibile come ripiego.
+PARSER_ENGINES = ["lxml", "html.parser"]
+
+# Valore restituito da _get_page_content quando il server risponde 304 Not Modified
+NOT_MODIFIED = object()
+
+# Classi dei moduli CSS delle card: il suffisso cambia a ogni rilascio del sito
+LAYOUT_CLASS_RE = re.compile(r'\b(?:SmallCard|ItemCard)-module_[\w-]+')
+
+# Impronte di layout ricordate per riconoscere un cambio di layout
+MAX_KNOWN_LAYOUTS = 50
+
+# Classi che identificano il contenitore principale di un annuncio
+CARD_ROOT_CLASS_RE = re.compile(r'^(item-card|SmallCard-module_card__\w+|ItemCard-module_card__\w+)$')
+TITLE_CLASS_RE = re.compile(r'(title|item-title)')
+PRICE_CLASS_RE = re.compile(r'price')
+LOCATION_CLASS_RE = re.compile(r'(PostingTimeAndPlace|town|city|location)')
+
+# Risale dall'elemento trovato da un selettore fino al contenitore dell'annuncio
+def _card_root(element, max_depth=8):
+    node = element
+    for _ in range(max_depth):
+        if node is None or node.name in ('body', 'html', '[document]'):
+            break
+        if any(CARD_ROOT_CLASS_RE.match(cls) for cls in node.get('class', [])):
+            return node
+        node = node.parent
+    return element
+
+# Visita una sola volta i discendenti della card raccogliendo titolo, prezzo,
+# link, location, immagine, testo e indicatori di vendita
+def _walk_card(card):
+    fields = {
+        'title': None,
+        'generic_title': None,
+        'any_heading': None,
+        'price': None,
+        'generic_price': None,
+        'link': card if card.name == 'a' and card.has_attr('href') else None,
+        'location': None,
+        'image': None,
+        'sold': None
+    }
+    texts = []
+    
+    for node in card.descendants:
+        if isinstance(node, NavigableString):
+            if type(node) is NavigableString:
+                texts.append(node)
+            continue
+        
+        name = node.name
+        classes = ' '.join(node.get('class', []))
+        
+        # Indicatori di vendita conclusa
+        if not fields['sold']:
+            if 'no-item-available' in classes:
+                fields['sold'] = 'no-item-available'
+            elif name == 'span' and 'item-sold-badge' in classes and 'Venduto' in node.get_text():
+                fields['sold'] = 'item-sold-badge'
+            elif name == 'article' and 'notice-module_notice' in classes and 'concluso la trattativa' in node.get_text():
+                fields['sold'] = 'trattativa conclusa'
+            elif 'badge' in classes and 'venduto' in node.get_text().lower():
+                fields['sold'] = 'badge venduto'
+        
+        if name in ('h2', 'h3', 'h4'):
+            if not fields['title'] and name == 'h2' and 'ItemTitle-module_item-title__' in classes:
+                fields['title'] = node
+            if not fields['generic_title'] and TITLE_CLASS_RE.search(classes):
+                fields['generic_title'] = node
+            if not fields['any_heading']:
+                fields['any_heading'] = node
+        elif name in ('p', 'div', 'span') and 'price' in classes:
+            if not fields['price'] and name == 'p' and 'index-module_price__N7M2x' in classes:
+                fields['price'] = node
+            if not fields['generic_price']:
+                fields['generic_price'] = node
+        elif name == 'a' and not fields['link'] and node.has_attr('href'):
+            fields['link'] = node
+        elif name == 'img' and not fields['image']:
+            fields['image'] = node
+        
+        if not fields['location'] and classes and LOCATION_CLASS_RE.search(classes):
+            fields['location'] = node
+    
+    fields['title'] = fields['title'] or fields['generic_title'] or fields['any_heading']
+    fields['price'] = fields['price'] or fields['generic_price']
+    fields['text'] = ''.join(texts)
+    return fields
+
+# Impronta della struttura della pagina: l'insieme delle classi dei moduli CSS
+# delle card, letto dall'HTML senza costruire il DOM. Stringa vuota se non ce ne sono.
+def layout_fingerprint(html_content):
+    classes = set(LAYOUT_CLASS_RE.findall(html_content))
+    if not classes:
+        return ""
+    return hashlib.sha1("\n".join(sorted(classes)).encode()).hexdigest()[:16]
+
+# Marcatore dello script Next.js che contiene lo stato iniziale della pagina
+NEXT_DATA_MARKER = '<script id="__NEXT_DATA__" type="application/json">'
+
+# Estrae la lista degli annunci dal JSON incorporato nelle pagine di ricerca.
+# Restituisce None se il JSON manca o non ha la struttura attesa.
+def extract_embedded_ads(html_content):
+    start = html_content.find(NEXT_DATA_MARKER)
+    if start == -1:
+        return None
+    
+    try:
+        # Decodifica direttamente dalla posizione dello script senza copiare la pagina
+        data, _ = json.JSONDecoder().raw_decode(html_content, start + len(NEXT_DATA_MARKER))
+        items = data['props']['pageProps']['initialState']['items']['list']
+    except (ValueError, KeyError, TypeError) as e:
+        logging.debug(f"JSON incorporato non utilizzabile: {e}")
+        return None
+    
+    if not isinstance(items, list):
+        return None
+    
+    # Gli annunci in vetrina sono inseriti prima o dopo gli elementi della lista
+    ads = []
+    for entry in items:
+        if not isinstance(entry, dict):
+            continue
+        
+        candidates = [_slot_ad(slot) for slot in entry.get('before') or []]
+        candidates.append(entry.get('item'))
+        candidates.extend(_slot_ad(slot) for slot in entry.get('after') or [])
+        
+        for ad in candidates:
+            if isinstance(ad, dict) and ad.get('kind', 'AdItem') == 'AdItem' and ad.get('urls'):
+                ads.append(ad)
+    return ads
+
+def _slot_ad(slot):
+    if isinstance(slot, dict) and isinstance(slot.get('model'), dict):
+        return slot['model'].get('adItem')
+    return None
+
+# Controlla gli indicatori di vendita conclusa presenti nel JSON dell'annuncio
+def _json_ad_is_sold(ad):
+    if ad.get('sold') or ad.get('isSold'):
+        return True
+    
+    for uri, feature in (ad.get('features') or {}).items():
+        if 'sold' in uri or 'transaction_status' in uri:
+            for value in feature.get('values') or []:
+                if str(value.get('key', '')).lower() not in ('', '0', 'false') or 'venduto' in str(value.get('value', '')).lower():
+                    return True
+    return False
+
+# Avviso "venduto" e badge del prezzo nella pagina di dettaglio di un annuncio
+SOLD_DETAIL_RE = re.compile(r'class="[^"]*(?:AdInfo_sold-box|item-sold-badge)')
+
+# Stato di un annuncio dalla sua pagina di dettaglio: basta cercare le classi,
+# senza costruire il DOM. None se la pagina non è stata scaricata.
+def detail_page_status(html_content):
+    if not html_content or html_content is NOT_MODIFIED:
+        return None
+    return "sold" if SOLD_DETAIL_RE.search(html_content) else "available"
+
+# Verifica che il titolo sia pertinente rispetto ai termini di ricerca
+def is_relevant(title, search_terms):
+    title_lower = title.lower()
+    relevant = any(term in title_lower for term in search_terms)
+    
+    if not relevant and len(search_terms) > 1:
+        # Se non troviamo corrispondenze esatte, controlliamo se almeno il 50% dei termini è presente
+        matches = sum(1 for term in search_terms if term in title_lower)
+        relevant = matches / len(search_terms) >= 0.5
+    
+    return relevant
+
+# Verifica la pertinenza di un titolo rispetto a molte ricerche in una sola
+# passata: i termini di tutte le ricerche sono compilati in un automa
+# Aho-Corasick e un indice inverso collega ogni termine alle sue ricerche.
+# Il risultato coincide con is_relevant applicata a ciascuna ricerca.
+class SearchMatcher:
+    def __init__(self, search_names):
+        self.search_terms = [name.lower().split() for name in search_names]
+        self._term_ids = {}
+        self._term_searches = []
+        for search_index, terms in enumerate(self.search_terms):
+            for term in terms:
+                term_id = self._term_ids.setdefault(term, len(self._term_ids))
+                if term_id == len(self._term_searches):
+                    self._term_searches.append(set())
+                self._term_searches[term_id].add(search_index)
+        self._build_automaton()
+    
+    def _build_automaton(self):
+        self._goto = [{}]
+        self._outputs = [[]]
+        for term, term_id in self._term_ids.items():
+            state = 0
+            for char in term:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._outputs.append([])
+                state = next_state
+            self._outputs[state].append(term_id)
+        
+        # Collegamenti di fallimento calcolati in ampiezza
+        self._fail = [0] * len(self._goto)
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, next_state in self._goto[state].items():
+                pending.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+    
+    def _find_terms(self, text):
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._outputs[state]:
+                found.update(self._outputs[state])
+        return found
+    
+    def match(self, title):
+        # Restituisce gli indici delle ricerche per cui il titolo è pertinente:
+        # come in is_relevant basta che compaia uno dei termini della ricerca
+        relevant = set()
+        for term_id in self._find_terms(title.lower()):
+            relevant.update(self._term_searches[term_id])
+        return sorted(relevant)
+
+# Ricava l'ID dell'annuncio dal suo link
+def extract_item_id(link):
+    id_match = re.search(r'/(\d+)\.html', link)
+    if id_match:
+        return id_match.group(1)
+    return link.split('/')[-1]
+
+# Annuncio estratto da una pagina. Occupa molta meno memoria di un dict ma si
+# legge come prima: product['price'], product.get('location'), {**product}.
+# Le location si ripetono tra migliaia di annunci e vengono internate.
+class Product(Mapping):
+    __slots__ = ('id', 'title', 'price', 'link', 'image', 'location')
+    
+    def __init__(self, id, title, price, link, image=None, location=None):
+        self.id = id
+        self.title = title
+        self.price = price
+        self.link = link
+        self.image = image
+        self.location = sys.intern(location) if location else location
+    
+    def __getitem__(self, key):
+        if key not in Product.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __iter__(self):
+        return iter(Product.__slots__)
+    
+    def __len__(self):
+        return len(Product.__slots__)
+    
+    def __reduce__(self):
+        # Serializzazione compatta per il ritorno dai worker del pool di parsing
+        return (Product, (self.id, self.title, self.price, self.link, self.image, self.location))
+    
+    def __repr__(self):
+        return f"Product({dict(self)!r})"
+
+# Estrazione dei prodotti da una pagina di risultati. Non dipende dal monitor,
+# così può essere eseguita anche in un processo worker del pool di parsing.
+class PageParser:
+    def __init__(self, parser_engine, embedded_json=True):
+        self.parser_engine = parser_engine
+        self.embedded_json = embedded_json
+    
+    def parse(self, html_content, product_name):
+        # Restituisce solo dati semplici, così il risultato può tornare da un processo worker.
+        # Con product_name None (feed condiviso) non viene applicato il filtro di pertinenza.
+        start = time.perf_counter()
+        drops = Counter()
+        selector_matches = Counter()
+        products, path, items_found, layout = self._parse_page(html_content, product_name, drops, selector_matches)
+        return {
+            "products": products,
+            "path": path,
+            "items_found": items_found,
+            "drops": dict(drops),
+            "selector_matches": dict(selector_matches),
+            "layout": layout,
+            "seconds": time.perf_counter() - start
+        }
+    
+    def _make_soup(self, html_content):
+        return BeautifulSoup(html_content, self.parser_engine)
+    
+    def _parse_page(self, html_content, product_name, drops, selector_matches):
+        # Restituisce i prodotti, il percorso di parsing usato ("json" o "dom") e gli annunci trovati
+        products = []
+        
+        # Prepara il termine di ricerca per verificare la pertinenza
+        search_terms = product_name.lower().split() if product_name is not None else None
+        
+        # Percorso veloce: i dati degli annunci sono già presenti nel JSON incorporato nella pagina
+        if self.embedded_json:
+            ad_items = extract_embedded_ads(html_content)
+            if ad_items is not None:
+                selector_matches["__NEXT_DATA__"] += len(ad_items)
+                products = self._products_from_json(ad_items, search_terms, drops)
+                logging.info(f"Estratti {len(products)} prodotti dal JSON incorporato")
+                return products, "json", len(ad_items), ""
+        
+        soup = self._make_soup(html_content)
+        
+        # Troviamo una sola volta il contenitore principale di ogni annuncio
+        cards = self._find_card_roots(soup, selector_matches)
+        
+        # Analizza ogni card trovata, scartando gli annunci con ID già visto nella pagina
+        seen_ids = set()
+        for card in cards:
+            try:
+                product = self._extract_card(card, search_terms, drops)
+                if not product or product['id'] in seen_ids:
+                    continue
+                
+                seen_ids.add(product['id'])
+                products.append(product)
+                logging.debug(f"Estratto prodotto: {product['title']} - €{product['price']}")
+                
+            except Exception as e:
+                logging.error(f"Errore durante l'analisi di un prodotto: {e}")
+                continue
+        
+        # L'impronta del layout permette a chi riceve il risultato di accorgersi di un cambio di layout
+        return products, "dom", len(cards), layout_fingerprint(html_content)
+    
+    def _products_from_json(self, ad_items, search_terms, drops):
+        products = []
+        seen_ids = set()
+        for ad in ad_items:
+            try:
+                product = self._product_from_json(ad, search_terms, drops)
+                if not product or product['id'] in seen_ids:
+                    continue
+                
+                seen_ids.add(product['id'])
+                products.append(product)
+                logging.debug(f"Estratto prodotto: {product['title']} - €{product['price']}")
+                
+            except Exception as e:
+                logging.error(f"Errore durante l'analisi di un prodotto dal JSON: {e}")
+                continue
+        
+        return products
+    
+    def _product_from_json(self, ad, search_terms, drops):
+        title = (ad.get('subject') or '').strip()
+        if not title:
+            return None
+        
+        if _json_ad_is_sold(ad):
+            logging.debug(f"Prodotto ignorato perché risulta venduto: {title}")
+            drops['sold'] += 1
+            return None
+        
+        # Verifica se il testo del titolo contiene indicazioni che l'oggetto è venduto
+        if 'venduto' in title.lower():
+            logging.debug(f"Prodotto ignorato perché il titolo contiene 'venduto': {title}")
+            drops['sold'] += 1
+            return None
+        
+        if search_terms is not None and not is_relevant(title, search_terms):
+            logging.debug(f"Prodotto ignorato (non pertinente): {title}")
+            drops['irrelevant'] += 1
+            return None
+        
+        # Il prezzo è nella feature '/price', la chiave contiene il valore numerico
+        price_values = ad.get('features', {}).get('/price', {}).get('values') or []
+        if not price_values:
+            return None
+        
+        try:
+            price = float(str(price_values[0].get('key', '')).replace(',', '.'))
+        except ValueError:
+            logging.debug(f"Impossibile convertire il prezzo '{price_values[0]}' per: {title}")
+            return None
+        
+        link = (ad.get('urls') or {}).get('default')
+        if not link:
+            return None
+        
+        if not link.startswith('http'):
+            link = f"https://www.subito.it{link}"
+        
+        # Location nel formato mostrato dalle card, es. "Lecco (LC)"
+        location = None
+        geo = ad.get('geo') or {}
+        town = (geo.get('town') or {}).get('value')
+        city_short = (geo.get('city') or {}).get('shortName')
+        if town:
+            location = f"{town} ({city_short})" if city_short else town
+        
+        img_url = None
+        images = ad.get('images') or []
+        if images and images[0].get('cdnBaseUrl'):
+            img_url = f"{images[0]['cdnBaseUrl']}?rule=card-desktop-new-small-1x-auto"
+        
+        return Product(extract_item_id(link), title, price, link, img_url, location)
+    
+    def _find_card_roots(self, soup, selector_matches):
+        # Selettori aggiornati basati sull'HTML fornito
+        # Cerchiamo le SmallCard che sono i container dei prodotti
+        selectors = [
+            'div.SmallCard-module_picture-group__asLo2',  # Contenitore intero della card
+            'div.SmallCard-module_item-key-data__fcbjY',  # Contenitore dei dati principali
+            'a.SmallCard-module_link__hOkzY',             # Link dell'annuncio
+            'a.ItemCard-module_card__Gy7SX',              # Possibile alternativa
+            'div[class*="SmallCard-module"]',             # Qualsiasi div con classe che contiene SmallCard-module
+            'div[class*="ItemCard-module"]'               # Qualsiasi div con classe che contiene ItemCard-module
+        ]
+        
+        # I selettori si sovrappongono: ogni elemento trovato viene ricondotto
+        # al contenitore dell'annuncio e deduplicato per identità
+        seen = set()
+        cards = []
+        for selector in selectors:
+            items = soup.select(selector)
+            if items:
+                logging.info(f"Trovati {len(items)} elementi con selettore: {selector}")
+                selector_matches[selector] += len(items)
+                for item in items:
+                    card = _card_root(item)
+                    if id(card) not in seen:
+                        seen.add(id(card))
+                        cards.append(card)
+        
+        logging.info(f"Trovati {len(cards)} elementi unici per analisi")
+        
+        # Se non abbiamo trovato elementi con i selettori specifici, cerchiamo tutte le card possibili
+        if not cards:
+            logging.warning("Nessun elemento trovato con i selettori noti. Tentativo con metodo alternativo...")
+            
+            # Cerchiamo tutti i possibili container di card in base al modello fornito
+            potential_items = soup.find_all(['div', 'a'], class_=re.compile(r'(SmallCard|ItemCard|Card)'))
+            
+            for item in potential_items:
+                card = _card_root(item)
+                if id(card) not in seen:
+                    seen.add(id(card))
+                    cards.append(card)
+            
+            logging.info(f"Trovati {len(cards)} elementi con metodo alternativo")
+        
+        return cards
+    
+    def _extract_card(self, card, search_terms, drops):
+        # Una sola visita dell'albero della card raccoglie tutti i campi e gli indicatori di vendita
+        fields = _walk_card(card)
+        
+        if fields['sold']:
+            logging.debug(f"Prodotto ignorato perché risulta venduto ({fields['sold']})")
+            drops['sold'] += 1
+            return None
+        
+        # Verifica nel testo generale del prodotto
+        item_text = fields['text'].lower()
+        if 'venduto' in item_text and ('concluso' in item_text or 'trattativa' in item_text):
+            logging.debug("Prodotto ignorato perché contiene testo che indica vendita conclusa")
+            drops['sold'] += 1
+            return None
+        
+        title_element = fields['title']
+        
+        # Se l'elemento non è una card completa, cerchiamo il titolo nei genitori
+        if not title_element:
+            parent = card.parent
+            for _ in range(2):  # Limita la ricerca a 3 livelli compreso l'elemento stesso
+                if parent:
+                    title_element = parent.find(['h2', 'h3', 'h4'])
+                    if title_element:
+                        break
+                    parent = parent.parent
+        
+        # Se non troviamo ancora un titolo, passiamo all'elemento successivo
+        if not title_element:
+            return None
+        
+        title = title_element.get_text().strip()
+        
+        # Verifica se il testo del titolo contiene indicazioni che l'oggetto è venduto
+        if 'venduto' in title.lower():
+            logging.debug(f"Prodotto ignorato perché il titolo contiene 'venduto': {title}")
+            drops['sold'] += 1
+            return None
+        
+        # Verifica la pertinenza del prodotto rispetto alla ricerca
+        if search_terms is not None and not is_relevant(title, search_terms):
+            logging.debug(f"Prodotto ignorato (non pertinente): {title}")
+            drops['irrelevant'] += 1
+            return None
+        
+        price_element = fields['price']
+        
+        # Se l'elemento non è una card completa, cerchiamo il prezzo nei genitori
+        if not price_element:
+            parent = card.parent
+            for _ in range(2):
+                if parent:
+                    price_element = parent.find(['p', 'div', 'span'], class_=PRICE_CLASS_RE)
+                    if price_element:
+                        break
+                    parent = parent.parent
+        
+        # Se non troviamo un prezzo, cerca nel testo dell'intero elemento
+        if not price_element:
+            price_matches = re.findall(r'(\d{1,3}(?:\.\d{3})*(?:,\d{1,2})?)\s*€|\€\s*(\d{1,3}(?:\.\d{3})*(?:,\d{1,2})?)', fields['text'])
+            
+            # Appiattisci la lista di tuple e rimuovi stringhe vuote
+            price_candidates = [p for group in price_matches for p in group if p]
+            
+            if not price_candidates:
+                return None  # Nessun prezzo trovato
+            price_text = price_candidates[0]
+        else:
+            # Ottieni il testo del prezzo e rimuovi elementi figli (come badge di spedizione)
+            price_text = ''.join([text for text in price_element.contents if isinstance(text, str)]).strip()
+            
+            # Se non abbiamo testo diretto, usa il testo completo
+            if not price_text:
+                price_text = price_element.get_text().strip()
+        
+        # Estrai il prezzo dal testo
+        price_match = re.search(r'(\d{1,3}(?:\.\d{3})*(?:,\d{1,2})?)', price_text)
+        if not price_match:
+            return None
+        
+        price_text = price_match.group(1)
+        
+        # Pulizia e conversione del prezzo
+        price_text = price_text.replace('.', '').replace(',', '.').strip()
+        
+        try:
+            price = float(price_text)
+        except ValueError:
+            logging.debug(f"Impossibile convertire il prezzo '{price_text}' per: {title}")
+            return None
+        
+        # Estrai il link: l'elemento stesso, il primo link interno o un link tra i genitori
+        link_element = fields['link']
+        if not link_element:
+            parent = card.parent
+            while parent and parent.name != 'html':
+                if parent.name == 'a' and parent.has_attr('href'):
+                    link_element = parent
+                    break
+                parent = parent.parent
+        
+        if not link_element:
+            return None
+        
+        link = link_element['href']
+        if not link:
+            return None
+        
+        # Assicurati che il link sia assoluto
+        if not link.startswith('http'):
+            link = f"https://www.subito.it{link}"
+        
+        # Trova l'ID del prodotto
+        item_id = extract_item_id(link)
+        
+        # Estrai la location se disponibile
+        location = None
+        if fields['location']:
+            location = fields['location'].get_text().strip()
+            # Pulisci la location da date o altre informazioni
+            location = re.sub(r'\d+\s+\w+\s+alle\s+\d+:\d+', '', location).strip()
+        
+        # Estrai l'URL dell'immagine
+        img_element = fields['image']
+        img_url = None
+        if img_element and img_element.has_attr('src'):
+            img_url = img_element['src']
+        
+        return Product(item_id, title, price, link, img_url, location)
+
+# Parser del processo worker, creato una sola volta dall'inizializzatore del pool
+_worker_parser = None
+
+def _init_parse_worker(parser_engine, embedded_json):
+    global _worker_parser
+    _worker_parser = PageParser(parser_engine, embedded_json)
+
+# Eseguita nei processi del pool: riceve l'HTML e restituisce solo i dati dei prodotti
+def _parse_in_worker(html_content, product_name):
+    return _worker_parser.parse(html_content, product_name)
+
+# Storico prezzi di una ricerca in colonne compatte: indice dell'annuncio,
+# prezzo e timestamp (secondi epoch) in array tipizzati invece di un oggetto per
+# osservazione. Oltre max_points vengono scartate le osservazioni più vecchie.
+class PriceHistory:
+    def __init__(self, max_points=0):
+        self.max_points = max_points
+        self._lock = threading.Lock()
+        self._index = {}              # ID annuncio -> indice intero
+        self._ids = []                # Indice intero -> ID annuncio
+        self._products = array('I')
+        self._prices = array('d')
+        self._timestamps = array('d')
+    
+    def __len__(self):
+        return len(self._prices)
+    
+    def extend(self, rows, timestamp):
+        # rows: coppie (ID annuncio, prezzo) osservate nello stesso istante
+        with self._lock:
+            for product_id, price in rows:
+                index = self._index.get(product_id)
+                if index is None:
+                    index = self._index[product_id] = len(self._ids)
+                    self._ids.append(product_id)
+                self._products.append(index)
+                self._prices.append(price)
+                self._timestamps.append(timestamp)
+            
+            if self.max_points and len(self._prices) > self.max_points:
+                excess = len(self._prices) - self.max_points * 3 // 4
+                del self._products[:excess]
+                del self._prices[:excess]
+                del self._timestamps[:excess]
+                self._renumber()
+    
+    def _renumber(self):
+        # Dopo il taglio tiene nella tabella solo gli annunci ancora presenti,
+        # così indice e ID non crescono con tutti gli annunci mai visti
+        remap = {}
+        ids = []
+        for i, index in enumerate(self._products):
+            new_index = remap.get(index)
+            if new_index is None:
+                new_index = remap[index] = len(ids)
+                ids.append(self._ids[index])
+            self._products[i] = new_index
+        self._ids = ids
+        self._index = {product_id: index for index, product_id in enumerate(ids)}
+    
+    def columns(self):
+        # Copie delle colonne (indici, prezzi, timestamp) e tabella degli ID,
+        # utilizzabili senza tenere il lock, ad esempio con numpy.frombuffer
+        with self._lock:
+            return array('I', self._products), array('d', self._prices), array('d', self._timestamps), list(self._ids)
+
+# Archivio persistente dei prodotti e dello storico prezzi su SQLite.
+# Le scritture sono accodate e applicate da un thread dedicato con una sola
+# transazione per ciclo di ricerca; gli ID già visti restano in memoria.
+# Un annuncio può comparire in più ricerche: novità, ultimo prezzo e notifica
+# sono tenuti per coppia (ricerca, annuncio).
+class PriceStore:
+    def __init__(self, db_file, history_days=30, history_max_points=200000):
+        self.db_file = db_file
+        self.history_days = history_days
+        self.history_max_points = history_max_points
+        self._queue = queue.Queue()
+        self._cache_lock = threading.Lock()
+        self._last_prices = {}    # ricerca -> {ID: ultimo prezzo}; le chiavi sono anche gli annunci già visti
+        self._notified = set()    # (ricerca, ID) già consegnati da almeno un canale di notifica
+        self._history = {}
+        
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        self._warm_cache()
+        
+        self._writer = threading.Thread(target=self._writer_loop, name="PriceStoreWriter", daemon=True)
+        self._writer.start()
+    
+    def _create_schema(self):
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS products (
+                    id TEXT PRIMARY KEY,
+                    title TEXT,
+                    price REAL,
+                    link TEXT,
+                    search_query TEXT,
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    notified INTEGER DEFAULT 0
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS price_history (
+                    product_id TEXT,
+                    price REAL,
+                    timestamp TIMESTAMP,
+                    search_query TEXT,
+                    FOREIGN KEY (product_id) REFERENCES products (id)
+                )
+            """)
+            # Nei database esistenti lo storico non registra la ricerca che ha osservato il prezzo
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(price_history)")}
+            if "search_query" not in columns:
+                self._conn.execute("ALTER TABLE price_history ADD COLUMN search_query TEXT")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_products (
+                    search_query TEXT,
+                    product_id TEXT,
+                    price REAL,
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    notified INTEGER DEFAULT 0,
+                    PRIMARY KEY (search_query, product_id)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_price_history_product_time ON price_history (product_id, timestamp)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_products_search_query ON products (search_query)")
+            
+            # Aggregati per ricerca e annuncio aggiornati a ogni ciclo, per i report senza scorrere price_history
+            backfill = not self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_stats'").fetchone()
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS product_stats (
+                    product_id TEXT,
+                    search_query TEXT,
+                    first_price REAL,
+                    prev_price REAL,
+                    last_price REAL,
+                    min_price REAL,
+                    max_price REAL,
+                    observations INTEGER,
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    PRIMARY KEY (search_query, product_id)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_product_stats_search_seen ON product_stats (search_query, last_seen)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_daily_stats (
+                    search_query TEXT,
+                    day TEXT,
+                    listings INTEGER,
+                    mean REAL,
+                    p10 REAL,
+                    p25 REAL,
+                    p50 REAL,
+                    p75 REAL,
+                    p90 REAL,
+                    PRIMARY KEY (search_query, day)
+                )
+            """)
+            if backfill:
+                self._backfill_product_stats()
+    
+    def _backfill_product_stats(self):
+        # Ricostruisce gli aggregati per ricerca e prodotto da uno storico esistente;
+        # le righe senza ricerca vengono attribuite alla ricerca salvata sul prodotto
+        self._conn.execute("""
+            INSERT INTO product_stats (product_id, search_query, first_price, prev_price, last_price, min_price, max_price, observations, first_seen, last_seen)
+            SELECT h.product_id, h.search_query,
+                   MAX(CASE WHEN h.position = 1 THEN h.price END),
+                   MAX(CASE WHEN h.position = h.total - 1 THEN h.price END),
+                   MAX(CASE WHEN h.position = h.total THEN h.price END),
+                   MIN(h.price), MAX(h.price), h.total,
+                   MIN(h.timestamp), MAX(h.timestamp)
+            FROM (
+                SELECT h.product_id, h.price, h.timestamp, COALESCE(h.search_query, p.search_query) AS search_query,
+                       ROW_NUMBER() OVER (PARTITION BY COALESCE(h.search_query, p.search_query), h.product_id ORDER BY h.timestamp) AS position,
+                       COUNT(*) OVER (PARTITION BY COALESCE(h.search_query, p.search_query), h.product_id) AS total
+                FROM price_history h JOIN products p ON p.id = h.product_id
+            ) h
+            WHERE h.search_query IS NOT NULL
+            GROUP BY h.search_query, h.product_id
+        """)
+    
+    def _warm_cache(self):
+        # Carica gli annunci già noti per ogni ricerca per evitare accessi al disco durante la scansione
+        for search_query, product_id, price, notified in self._conn.execute("SELECT search_query, product_id, price, notified FROM search_products"):
+            self._last_prices.setdefault(search_query, {})[product_id] = price
+            if notified:
+                self._notified.add((search_query, product_id))
+        logging.info(f"Caricati {sum(map(len, self._last_prices.values()))} prodotti noti da {self.db_file}")
+        
+        if not self.history_days:
+            return
+        
+        # Storico recente in memoria, raggruppato per ricerca e per istante di osservazione
+        cutoff = (datetime.now() - timedelta(days=self.history_days)).isoformat()
+        rows = self._conn.execute("""
+            SELECT COALESCE(h.search_query, p.search_query), h.timestamp, h.product_id, h.price
+            FROM price_history h JOIN products p ON p.id = h.product_id
+            WHERE h.timestamp >= ?
+            ORDER BY h.timestamp
+        """, (cutoff,))
+        count = 0
+        for (search_query, timestamp), group in itertools.groupby(rows, key=lambda row: (row[0], row[1])):
+            observations = [(product_id, price) for _, _, product_id, price in group]
+            self._history_for(search_query).extend(observations, datetime.fromisoformat(timestamp).timestamp())
+            count += len(observations)
+        logging.info(f"Caricate {count} osservazioni di prezzo degli ultimi {self.history_days} giorni")
+    
+    def _history_for(self, search_query):
+        history = self._history.get(search_query)
+        if history is None:
+            history = self._history[search_query] = PriceHistory(self.history_max_points)
+        return history
+    
+    def history(self, search_query):
+        # Storico in memoria della ricerca, o None se non ci sono osservazioni
+        with self._cache_lock:
+            return self._history.get(search_query)
+    
+    def seen_ids(self, search_query):
+        # Annunci già visti dalla ricerca, dalla cache in memoria
+        with self._cache_lock:
+            return set(self._last_prices.get(search_query, ()))
+    
+    def observe(self, search_query, product):
+        # Aggiorna la cache in memoria e restituisce, per questa ricerca, (nuovo, prezzo precedente se ribassato)
+        with self._cache_lock:
+            last_prices = self._last_prices.setdefault(search_query, {})
+            old_price = last_prices.get(product['id'])
+            is_new = product['id'] not in last_prices
+            last_prices[product['id']] = product['price']
+            if is_new:
+                return True, None
+        
+        if old_price is not None and product['price'] < old_price:
+            return False, old_price
+        return False, None
+    
+    def write_cycle(self, search_query, rows):
+        # Accoda la scrittura di un ciclo di ricerca: righe (id, titolo, prezzo, link)
+        now = datetime.now()
+        timestamp = now.isoformat()
+        self._queue.put(("cycle", [(pid, title, price, link, search_query, timestamp) for pid, title, price, link in rows]))
+        
+        if self.history_days:
+            with self._cache_lock:
+                history = self._history_for(search_query)
+            history.extend([(pid, price) for pid, _, price, _ in rows], now.timestamp())
+    
+    def is_notified(self, search_query, product_id):
+        with self._cache_lock:
+            return (search_query, product_id) in self._notified
+    
+    def mark_notified(self, search_query, product_ids):
+        with self._cache_lock:
+            self._notified.update((search_query, product_id) for product_id in product_ids)
+        self._queue.put(("notified", [(search_query, product_id) for product_id in product_ids]))
+    
+    def run_in_writer(self, func):
+        # Esegue func(conn) nel thread di scrittura, nella stessa transazione delle altre scritture
+        self._queue.put(("call", func))
+    
+    def _writer_loop(self):
+        while True:
+            task, rows = self._queue.get()
+            try:
+                if task == "stop":
+                    return
+                with self._conn:
+                    if task == "cycle":
+                        self._write_cycle(rows)
+                    elif task == "notified":
+                        self._conn.executemany("UPDATE search_products SET notified = 1 WHERE search_query = ? AND product_id = ?", rows)
+                        self._conn.executemany("UPDATE products SET notified = 1 WHERE id = ?", [(product_id,) for _, product_id in rows])
+                    elif task == "call":
+                        rows(self._conn)
+            except sqlite3.Error as e:
+                logging.error(f"Errore durante la scrittura su {self.db_file}: {e}")
+            except Exception:
+                # Un'operazione accodata con run_in_writer non deve fermare il thread di scrittura
+                logging.exception(f"Errore imprevisto nel thread di scrittura su {self.db_file} ({task})")
+            finally:
+                self._queue.task_done()
+    
+    def _write_cycle(self, rows):
+        # products tiene i dati dell'annuncio e la prima ricerca che l'ha trovato;
+        # lo stato per ricerca è in search_products
+        self._conn.executemany("""
+            INSERT INTO products (id, title, price, link, search_query, first_seen, last_seen, notified)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+            ON CONFLICT(id) DO UPDATE SET
+                title = excluded.title,
+                price = excluded.price,
+                link = excluded.link,
+                last_seen = excluded.last_seen
+        """, [(pid, title, price, link, query, ts, ts) for pid, title, price, link, query, ts in rows])
+        self._conn.executemany("""
+            INSERT INTO search_products (search_query, product_id, price, first_seen, last_seen, notified)
+            VALUES (?, ?, ?, ?, ?, 0)
+            ON CONFLICT(search_query, product_id) DO UPDATE SET
+                price = excluded.price,
+                last_seen = excluded.last_seen
+        """, [(query, pid, price, ts, ts) for pid, _, price, _, query, ts in rows])
+        self._conn.executemany(
+            "INSERT INTO price_history (product_id, price, timestamp, search_query) VALUES (?, ?, ?, ?)",
+            [(pid, price, ts, query) for pid, _, price, _, query, ts in rows]
+        )
+        self._conn.executemany("""
+            INSERT INTO product_stats (product_id, search_query, first_price, prev_price, last_price, min_price, max_price, observations, first_seen, last_seen)
+            VALUES (?, ?, ?, NULL, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT(search_query, product_id) DO UPDATE SET
+                prev_price = last_price,
+                last_price = excluded.last_price,
+                min_price = MIN(min_price, excluded.last_price),
+                max_price = MAX(max_price, excluded.last_price),
+                observations = observations + 1,
+                last_seen = excluded.last_seen
+        """, [(pid, query, price, price, price, price, ts, ts) for pid, _, price, _, query, ts in rows])
+    
+    def flush(self):
+        self._queue.join()
+    
+    def close(self):
+        self._queue.put(("stop", None))
+        self._writer.join()
+        self._conn.close()
+
+# Archivio compresso delle pagine scaricate, scritto in background.
+# I file sono chiamati <ricerca>__p<pagina>__<timestamp>.html.gz e quando
+# l'archivio supera i limiti vengono eliminati i più vecchi.
+class SnapshotArchive:
+    def __init__(self, directory, mode="empty", max_bytes=50 * 1024 * 1024, max_files=500):
+        self.directory = directory
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._queue = queue.Queue()
+        
+        os.makedirs(directory, exist_ok=True)
+        
+        # Indice dei file esistenti dal più vecchio al più recente
+        self._files = deque()
+        self._total_bytes = 0
+        for path in sorted(self._list_files(), key=os.path.getmtime):
+            size = os.path.getsize(path)
+            self._files.append((path, size))
+            self._total_bytes += size
+        
+        self._writer = threading.Thread(target=self._writer_loop, name="SnapshotWriter", daemon=True)
+        self._writer.start()
+    
+    def _list_files(self):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".html.gz")]
+    
+    def capture(self, html_content, search, page, items_found):
+        if self.mode == "empty" and items_found:
+            return
+        self._queue.put((html_content, search, page, datetime.now()))
+    
+    def _writer_loop(self):
+        while True:
+            html_content, search, page, timestamp = self._queue.get()
+            try:
+                self._write(html_content, search, page, timestamp)
+            except OSError as e:
+                logging.error(f"Errore durante il salvataggio della pagina nell'archivio: {e}")
+            finally:
+                self._queue.task_done()
+    
+    def _write(self, html_content, search, page, timestamp):
+        name = f"{_slugify(search)}__p{page}__{timestamp.strftime('%Y%m%d-%H%M%S-%f')}.html.gz"
+        path = os.path.join(self.directory, name)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(html_content)
+        
+        size = os.path.getsize(path)
+        self._files.append((path, size))
+        self._total_bytes += size
+        logging.debug(f"Pagina {page} di '{search}' archiviata in {path}")
+        
+        # Eliminazione circolare dei file più vecchi
+        while self._files and (len(self._files) > self.max_files or self._total_bytes > self.max_bytes):
+            old_path, old_size = self._files.popleft()
+            self._total_bytes -= old_size
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    
+    def flush(self):
+        self._queue.join()
+    
+    def iter_snapshots(self, search=None):
+        # Restituisce (ricerca, pagina, timestamp, html) dal più vecchio al più recente
+        slug = _slugify(search) if search else None
+        for path in sorted(self._list_files(), key=os.path.getmtime):
+            match = re.match(r'(.+)__p(\d+)__([\d-]+)\.html\.gz$', os.path.basename(path))
+            if not match or (slug and match.group(1) != slug):
+                continue
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                yield match.group(1), int(match.group(2)), match.group(3), f.read()
+
+def _slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-') or "ricerca"
+
+# Testo di una notifica: un solo messaggio per ricerca con tutti i risultati
+# del gruppo, troncato a max_length caratteri
+def format_notification(search, hits, max_length=None):
+    header = f"🔔 {len(hits)} risultati per '{search}'"
+    lines = [header]
+    for index, (product, old_price) in enumerate(hits):
+        if old_price is None:
+            line = f"🆕 {product['title']} - €{product['price']}"
+        else:
+            line = f"📉 {product['title']} - €{product['price']} (prima €{old_price})"
+        if product.get('location'):
+            line += f" - {product['location']}"
+        line += f"\n{product['link']}"
+        
+        remaining = len(hits) - index
+        if max_length and len("\n\n".join(lines + [line])) + len(f"\n\n... e altri {remaining}") > max_length:
+            lines.append(f"... e altri {remaining}")
+            break
+        lines.append(line)
+    return "\n\n".join(lines)
+
+# Errore di invio di una notifica; retryable indica se ha senso ritentare
+class NotificationError(Exception):
+    def __init__(self, message, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+# Canale di notifica: invia un testo riutilizzando la stessa connessione
+class NotificationChannel:
+    name = "base"
+    max_length = None
+    
+    def __init__(self, config, timeout):
+        self.config = config
+        self.timeout = timeout
+    
+    def send(self, text):
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+class HTTPNotificationChannel(NotificationChannel):
+    def __init__(self, config, timeout):
+        super().__init__(config, timeout)
+        self.session = requests.Session()
+    
+    def _post(self, url, **kwargs):
+        try:
+            response = self.session.post(url, timeout=self.timeout, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            raise NotificationError(f"{self.name}: {e}")
+        
+        if response.status_code in RETRY_STATUS_CODES:
+            raise NotificationError(
+                f"{self.name}: HTTP {response.status_code}",
+                retry_after=parse_retry_after(response.headers.get("Retry-After"))
+            )
+        if response.status_code >= 400:
+            raise NotificationError(f"{self.name}: HTTP {response.status_code} {response.text[:200]}", retryable=False)
+        return response
+    
+    def close(self):
+        self.session.close()
+
+class TelegramChannel(HTTPNotificationChannel):
+    name = "telegram"
+    max_length = 4096
+    
+    def send(self, text):
+        api_url = self.config.get("api_url", "https://api.telegram.org").rstrip("/")
+        self._post(
+            f"{api_url}/bot{self.config['bot_token']}/sendMessage",
+            json={"chat_id": self.config["chat_id"], "text": text, "disable_web_page_preview": True}
+        )
+
+class DiscordChannel(HTTPNotificationChannel):
+    name = "discord"
+    max_length = 2000
+    
+    def send(self, text):
+        self._post(self.config["webhook_url"], json={"content": text})
+
+class SmsChannel(HTTPNotificationChannel):
+    name = "sms"
+    max_length = 1600
+    
+    def send(self, text):
+        api_url = self.config.get("api_url", "https://api.twilio.com").rstrip("/")
+        account_sid = self.config["twilio_account_sid"]
+        self._post(
+            f"{api_url}/2010-04-01/Accounts/{account_sid}/Messages.json",
+            data={"From": self.config["twilio_phone_number"], "To": self.config["recipient_phone_number"], "Body": text},
+            auth=(account_sid, self.config["twilio_auth_token"])
+        )
+
+class EmailChannel(NotificationChannel):
+    name = "email"
+    
+    def __init__(self, config, timeout):
+        super().__init__(config, timeout)
+        self._smtp = None
+    
+    def _connect(self):
+        smtp = smtplib.SMTP(self.config["smtp_server"], self.config.get("smtp_port", 587), timeout=self.timeout)
+        if self.config.get("use_tls", True):
+            smtp.starttls()
+        if self.config.get("sender_password"):
+            smtp.login(self.config["sender_email"], self.config["sender_password"])
+        return smtp
+    
+    def send(self, text):
+        message = EmailMessage()
+        message["Subject"] = text.split("\n", 1)[0]
+        message["From"] = self.config["sender_email"]
+        message["To"] = self.config["recipient_email"]
+        message.set_content(text)
+        
+        try:
+            # La connessione resta aperta tra un invio e l'altro; se il server
+            # l'ha chiusa per inattività viene riaperta subito
+            if self._smtp is not None:
+                try:
+                    self._smtp.send_message(message)
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    self._smtp = None
+            self._smtp = self._connect()
+            self._smtp.send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise NotificationError(f"email: destinatario rifiutato {e}", retryable=False)
+        except (smtplib.SMTPException, OSError) as e:
+            self.close()
+            raise NotificationError(f"email: {e}")
+    
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+NOTIFICATION_CHANNELS = {
+    "telegram": TelegramChannel,
+    "email": EmailChannel,
+    "discord": DiscordChannel,
+    "sms": SmsChannel
+}
+
+# Smistamento non bloccante delle notifiche: ogni canale ha la sua coda e
+# il suo thread, così un server lento non ferma né le scansioni né gli altri
+# canali. I risultati arrivati entro batch_window_seconds vengono raggruppati
+# in un solo messaggio per ricerca.
+class NotificationDispatcher:
+    def __init__(self, channels, config, on_delivered=None, metrics=None):
+        self.config = {**DEFAULT_NOTIFICATION_CONFIG, **config}
+        self.on_delivered = on_delivered
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._in_flight = Counter()    # (ricerca, ID) -> eventi ancora in coda o in invio
+        self._workers = []
+        for channel in channels:
+            channel_queue = queue.Queue(maxsize=self.config["queue_size"])
+            thread = threading.Thread(target=self._worker_loop, args=(channel, channel_queue), name=f"Notifier-{channel.name}", daemon=True)
+            self._workers.append((channel, channel_queue, thread))
+            thread.start()
+    
+    def submit(self, search, hits):
+        # Non blocca mai il chiamante: se la coda di un canale è piena l'evento viene scartato
+        for channel, channel_queue, _ in self._workers:
+            self._track(search, hits, 1)
+            try:
+                channel_queue.put_nowait((search, hits))
+            except queue.Full:
+                self._track(search, hits, -1)
+                logging.warning(f"Coda notifiche {channel.name} piena, scartati {len(hits)} risultati per '{search}'")
+                self._count("subito_notifications_dropped_total", len(hits), channel=channel.name)
+    
+    def in_flight(self, search, product_id):
+        # Vero se l'annuncio è ancora in coda o in invio su almeno un canale
+        with self._lock:
+            return self._in_flight[(search, product_id)] > 0
+    
+    def _track(self, search, hits, delta):
+        with self._lock:
+            for product, _ in hits:
+                key = (search, product['id'])
+                self._in_flight[key] += delta
+                if self._in_flight[key] <= 0:
+                    del self._in_flight[key]
+    
+    def _worker_loop(self, channel, channel_queue):
+        while True:
+            event = channel_queue.get()
+            if event is None:
+                channel_queue.task_done()
+                channel.close()
+                return
+            
+            # Raccoglie gli altri eventi arrivati nella finestra di raggruppamento
+            batch = [event]
+            stop = False
+            deadline = time.monotonic() + self.config["batch_window_seconds"]
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = channel_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is None:
+                    stop = True
+                    break
+                batch.append(event)
+            
+            try:
+                self._deliver(channel, batch)
+            finally:
+                for search, hits in batch:
+                    self._track(search, hits, -1)
+                for _ in range(len(batch) + stop):
+                    channel_queue.task_done()
+            
+            if stop:
+                channel.close()
+                return
+    
+    def _deliver(self, channel, batch):
+        # Un messaggio per ricerca, senza ripetere lo stesso annuncio
+        grouped = {}
+        for search, hits in batch:
+            by_id = grouped.setdefault(search, {})
+            for product, old_price in hits:
+                by_id[product['id']] = (product, old_price)
+        
+        for search, by_id in grouped.items():
+            hits = sorted(by_id.values(), key=lambda hit: hit[0]['price'])
+            text = format_notification(search, hits, channel.max_length)
+            if self._send_with_retry(channel, text, search):
+                logging.info(f"Notifica {channel.name} inviata per '{search}' ({len(hits)} risultati)")
+                self._count("subito_notifications_sent_total", 1, channel=channel.name)
+                if self.on_delivered:
+                    self.on_delivered(search, [product['id'] for product, _ in hits])
+            else:
+                self._count("subito_notifications_failed_total", 1, channel=channel.name)
+    
+    def _send_with_retry(self, channel, text, search):
+        for attempt in range(self.config["max_retries"] + 1):
+            try:
+                channel.send(text)
+                return True
+            except NotificationError as e:
+                if not e.retryable or attempt == self.config["max_retries"]:
+                    logging.error(f"Invio della notifica {channel.name} per '{search}' fallito: {e}")
+                    return False
+                
+                delay = e.retry_after
+                if delay is None:
+                    delay = min(self.config["backoff_max"], self.config["backoff_base"] * 2 ** attempt)
+                    delay *= random.uniform(0.5, 1.0)
+                logging.warning(f"Invio della notifica {channel.name} fallito ({e}), nuovo tentativo tra {delay:.1f}s")
+                time.sleep(delay)
+        return False
+    
+    def _count(self, name, value, **labels):
+        if self.metrics:
+            self.metrics.inc(name, value, **labels)
+    
+    def flush(self):
+        for _, channel_queue, _ in self._workers:
+            channel_queue.join()
+    
+    def close(self, timeout=30):
+        # Invia quanto è già in coda, senza attendere oltre il timeout
+        for channel, channel_queue, _ in self._workers:
+            try:
+                channel_queue.put(None, timeout=timeout)
+            except queue.Full:
+                logging.warning(f"Coda notifiche {channel.name} ancora piena alla chiusura")
+        deadline = time.monotonic() + timeout
+        for _, _, thread in self._workers:
+            thread.join(max(0, deadline - time.monotonic()))
+
+# Fasi della pipeline di una ricerca. I prodotti scorrono uno alla volta dalle
+# pagine scaricate fino alle destinazioni, senza liste intermedie.
+def dedupe_products(products, stats=None):
+    # Tiene la prima occorrenza di ogni annuncio
+    seen_ids = set()
+    for product in products:
+        if product['id'] in seen_ids:
+            continue
+        seen_ids.add(product['id'])
+        if stats is not None:
+            stats['unique'] += 1
+        yield product
+
+def track_changes(products, store_sink=None):
+    # Abbina a ogni prodotto il cambiamento rispetto ai cicli precedenti: (nuovo, prezzo precedente)
+    for product in products:
+        change = store_sink.emit(product) if store_sink else (False, None)
+        yield product, change
+
+def filter_price(items, min_price, max_price, counts):
+    for product, change in items:
+        price = product['price']
+        if min_price <= price <= max_price:
+            counts['in_range'] += 1
+            logging.debug(f"Prodotto valido: {product['title']} - €{price}")
+            yield product, change
+        else:
+            counts['out_of_range'] += 1
+            logging.debug(f"Prodotto fuori range di prezzo: {product['title']} - €{price} (range: €{min_price}-€{max_price})")
+
+def verify_sold(items, verifier, counts):
+    # Scarica la pagina di dettaglio degli annunci nuovi e scarta quelli venduti.
+    # L'ordine è mantenuto: un annuncio esce quando la sua verifica e quelle
+    # precedenti sono concluse, con al più window verifiche in attesa.
+    window = verifier.max_workers * 2
+    pending = deque()
+    
+    def release():
+        product, change, future = pending.popleft()
+        if future is not None and future.result() == "sold":
+            counts['sold'] += 1
+            logging.info(f"Prodotto ignorato perché venduto (pagina di dettaglio): {product['title']}")
+            return None
+        return product, change
+    
+    for product, change in items:
+        status = verifier.status(product['id'])
+        if status == "sold":
+            counts['sold'] += 1
+            continue
+        
+        future = None
+        if status is None:
+            is_new, _ = change
+            if is_new:
+                future = verifier.submit(product)
+            else:
+                # Annuncio già visto ma mai verificato (ad esempio dopo un riavvio): lo verifica il ricontrollo periodico
+                verifier.track(product)
+        pending.append((product, change, future))
+        
+        while pending and (len(pending) > window or pending[0][2] is None or pending[0][2].done()):
+            item = release()
+            if item:
+                yield item
+    
+    while pending:
+        item = release()
+        if item:
+            yield item
+
+# Destinazioni dei prodotti: ognuna riceve emit(prodotto, cambiamento) e close() a fine ciclo
+
+# Registra nel database tutti i prodotti del ciclo, anche quelli fuori range
+class StoreSink:
+    def __init__(self, store, search_query):
+        self.store = store
+        self.search_query = search_query
+        self.new_count = 0
+        self.drop_count = 0
+        self.prices = []    # (ID, prezzo) osservati nel ciclo, per le statistiche di mercato
+        self._rows = []
+    
+    def emit(self, product, change=None):
+        is_new, old_price = self.store.observe(self.search_query, product)
+        self.new_count += is_new
+        self.drop_count += old_price is not None
+        self.prices.append((product['id'], product['price']))
+        self._rows.append((product['id'], product['title'], product['price'], product['link']))
+        return is_new, old_price
+    
+    def close(self):
+        if self._rows:
+            self.store.write_cycle(self.search_query, self._rows)
+            self._rows = []
+
+# Mantiene solo i limit prodotti più economici in un heap limitato, senza ordinare tutto
+class TopKSink:
+    def __init__(self, limit):
+        self.limit = limit
+        self._heap = []
+        self._seq = itertools.count()
+    
+    def emit(self, product, change):
+        if self.limit <= 0:
+            return
+        # In cima all'heap c'è il peggiore: prezzo più alto, a parità il più recente
+        item = (-product['price'], -next(self._seq), product)
+        if len(self._heap) < self.limit:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+    
+    def results(self):
+        return [product for _, _, product in sorted(self._heap, reverse=True)]
+    
+    def close(self):
+        pass
+
+# Stampa a fine ciclo i risultati raccolti dal TopKSink
+class ConsoleSink:
+    def __init__(self, top, product_name, min_price, max_price):
+        self.top = top
+        self.product_name = product_name
+        self.min_price = min_price
+        self.max_price = max_price
+    
+    def emit(self, product, change):
+        pass
+    
+    def close(self):
+        valid_products = self.top.results()
+        if valid_products:
+            print(f"\nRisultati per '{self.product_name}' (range €{self.min_price}-€{self.max_price}):")
+            print("-" * 80)
+            for i, product in enumerate(valid_products):
+                location_info = f" - {product['location']}" if product.get('location') else ""
+                print(f"{i+1}. {product['title']} - €{product['price']}{location_info}")
+                print(f"   🔗 {product['link']}")
+                print()
+        else:
+            print(f"\nNessun prodotto trovato per '{self.product_name}' nel range di prezzo €{self.min_price}-€{self.max_price}")
+
+# Scrive ogni prodotto nel range come riga JSON appena arriva
+class JsonlSink:
+    _lock = threading.Lock()
+    
+    def __init__(self, path, product_name, analytics=None):
+        self.path = path
+        self.product_name = product_name
+        self.analytics = analytics
+        self._file = None
+    
+    def emit(self, product, change):
+        is_new, old_price = change
+        record = {
+            "search": self.product_name,
+            "timestamp": datetime.now().isoformat(),
+            "new": is_new,
+            "previous_price": old_price,
+            **product
+        }
+        if self.analytics:
+            record["deal_score"] = self.analytics.deal_score(self.product_name, product['price'])
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        
+        # Più ricerche possono scrivere sullo stesso file contemporaneamente
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(line)
+                self._file.flush()
+            except OSError as e:
+                logging.error(f"Impossibile scrivere su {self.path}: {e}")
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+# Valuta gli annunci nuovi rispetto alla distribuzione dei prezzi della ricerca
+# e registra a fine ciclo i più convenienti
+class DealSink:
+    def __init__(self, analytics, product_name, threshold=0.8, limit=3):
+        self.analytics = analytics
+        self.product_name = product_name
+        self.threshold = threshold
+        self.limit = limit
+        self._deals = []
+    
+    def emit(self, product, change):
+        is_new, _ = change
+        if not is_new:
+            return
+        score = self.analytics.deal_score(self.product_name, product['price'])
+        if score is not None and score >= self.threshold:
+            self._deals.append((score, product['price'], product['title']))
+    
+    def close(self):
+        for score, price, title in heapq.nlargest(self.limit, self._deals):
+            logging.info(f"Nuovo annuncio conveniente per '{self.product_name}': {title} a €{price} (punteggio {score:.2f})")
+        self._deals = []
+
+# Invia subito al dispatcher gli annunci nuovi o ribassati, che li raggruppa per ricerca.
+# Gli annunci nel range mai consegnati (invio fallito, coda piena) vengono riproposti
+# al ciclo successivo, se non sono ancora in coda.
+class NotifierSink:
+    def __init__(self, notifier, product_name, store):
+        self.notifier = notifier
+        self.product_name = product_name
+        self.store = store
+    
+    def emit(self, product, change):
+        is_new, old_price = change
+        if is_new or old_price is not None:
+            self.notifier.submit(self.product_name, [(product, old_price)])
+        elif not self.store.is_notified(self.product_name, product['id']) and not self.notifier.in_flight(self.product_name, product['id']):
+            self.notifier.submit(self.product_name, [(product, None)])
+    
+    def close(self):
+        pass
+
+# Raccolta thread-safe di contatori, gauge e istogrammi con etichette,
+# esportabili in formato testo Prometheus o come riepilogo JSON
+class Metrics:
     def __init__(self):
-        self.config = self._load_config()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+    
+    def inc(self, name, value=1, **labels):
+        if not value:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+    
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                buckets = HISTOGRAM_BUCKETS.get(name, DEFAULT_HISTOGRAM_BUCKETS)
+                histogram = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+                self._histograms[key] = histogram
+            
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+                    break
+            histogram["sum"] += value
+            histogram["count"] += 1
+    
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({key[0] for key in values}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (metric, labels), value in sorted(values.items()):
+                        if metric == name:
+                            lines.append(f"{name}{_format_labels(labels)} {value}")
+            
+            for name in sorted({key[0] for key in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+    
+    def summary(self):
+        # Per gli istogrammi riporta conteggio, media e p50/p95 stimati dai bucket
+        with self._lock:
+            histograms = {}
+            for (name, labels), histogram in self._histograms.items():
+                count = histogram["count"]
+                histograms[f"{name}{_format_labels(labels)}"] = {
+                    "count": count,
+                    "avg": round(histogram["sum"] / count, 4) if count else 0,
+                    "p50": _bucket_quantile(histogram, 0.5),
+                    "p95": _bucket_quantile(histogram, 0.95)
+                }
+            
+            return {
+                "timestamp": datetime.now().isoformat(),
+                "counters": {f"{name}{_format_labels(labels)}": value for (name, labels), value in self._counters.items()},
+                "gauges": {f"{name}{_format_labels(labels)}": value for (name, labels), value in self._gauges.items()},
+                "histograms": histograms
+            }
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _bucket_quantile(histogram, q):
+    # Limite superiore del primo bucket che contiene il quantile richiesto
+    target = histogram["count"] * q
+    cumulative = 0
+    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+        cumulative += count
+        if count and cumulative >= target:
+            return bound
+    return None if not histogram["count"] else float("inf")
+
+# Server HTTP locale per le metriche: /metrics (Prometheus), /summary (JSON)
+# e /profile?search=NOME per profilare il prossimo ciclo di una ricerca
+class MetricsServer:
+    def __init__(self, monitor, host, port):
+        self.monitor = monitor
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+    
+    def _make_handler(self):
+        monitor = self.monitor
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path == "/metrics":
+                    self._reply(200, monitor.metrics.render_prometheus(), "text/plain; version=0.0.4")
+                elif parsed.path == "/summary":
+                    self._reply(200, json.dumps(monitor.metrics.summary()), "application/json")
+                elif parsed.path == "/profile":
+                    monitor.request_profile(dict(parse_qsl(parsed.query)).get("search"))
+                    self._reply(202, "Profilazione richiesta\n", "text/plain")
+                else:
+                    self._reply(404, "Not found\n", "text/plain")
+            
+            def _reply(self, status, body, content_type):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def start(self):
+        self._thread.start()
+        host, port = self._server.server_address[:2]
+        logging.info(f"Metriche disponibili su http://{host}:{port}/metrics")
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+# Token bucket per host con velocità adattiva: la velocità si dimezza a ogni
+# errore 429/5xx o timeout (al massimo una volta al secondo) e cresce di poco
+# dopo una serie di risposte corrette. Retry-After blocca l'host per il tempo indicato.
+class AdaptiveRateLimiter:
+    def __init__(self, rate, burst, min_rate=0.2, max_rate=8.0, adaptive=True, success_streak=10):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.adaptive = adaptive
+        self.success_streak = success_streak
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._successes = 0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+    
+    def on_success(self):
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._successes += 1
+            if self._successes >= self.success_streak and self.rate < self.max_rate:
+                self._successes = 0
+                self.rate = min(self.max_rate, self.rate + 0.5)
+                logging.debug(f"Velocità richieste aumentata a {self.rate:.2f}/s")
+    
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            self._successes = 0
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            if self.adaptive and now - self._last_decrease >= 1:
+                self._last_decrease = now
+                self.rate = max(self.min_rate, self.rate / 2)
+                logging.warning(f"Velocità richieste ridotta a {self.rate:.2f}/s")
+
+# Cache LRU con scadenza. Le richieste contemporanee per la stessa chiave
+# attendono un unico caricamento invece di ripeterlo.
+class TTLCache:
+    def __init__(self, ttl_seconds, max_entries, cacheable=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.cacheable = cacheable or (lambda value: value is not None)
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+    
+    def get_or_load(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.shared += 1
+        
+        if not owner:
+            return future.result()
+        
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        
+        with self._lock:
+            self._inflight.pop(key, None)
+            if self.cacheable(value):
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        
+        future.set_result(value)
+        return value
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "evictions": self.evictions,
+                "size": len(self._entries)
+            }
+
+# Stato degli annunci verificato sulla pagina di dettaglio. Le pagine sono
+# scaricate da un pool limitato con la stessa funzione (sessione e limiti per
+# host) delle pagine di ricerca; un annuncio venduto resta tale, uno
+# disponibile non viene riscaricato per ttl_seconds e poi passa al ricontrollo
+# periodico, dal più vecchio.
+class SoldVerifier:
+    def __init__(self, fetch, config, metrics=None):
+        self.fetch = fetch
+        self.max_workers = max(1, config["max_workers"])
+        self.ttl_seconds = config["ttl_seconds"]
+        self.recheck_interval_seconds = config["recheck_interval_minutes"] * 60
+        self.recheck_batch = config["recheck_batch"]
+        self.max_entries = max(1, config["max_entries"])
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._sold = OrderedDict()
+        self._checked = OrderedDict()    # ID -> (istante della verifica, link), dal più vecchio
+        self._inflight = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sold-check")
+    
+    def status(self, product_id):
+        # "sold", "available" se verificato entro ttl_seconds, altrimenti None
+        with self._lock:
+            if product_id in self._sold:
+                return "sold"
+            entry = self._checked.get(product_id)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+                return "available"
+            return None
+    
+    def track(self, product):
+        # Registra un annuncio mai verificato in testa alla coda dei ricontrolli
+        with self._lock:
+            if product['id'] not in self._checked and product['id'] not in self._sold:
+                self._checked[product['id']] = (float("-inf"), product['link'])
+                self._checked.move_to_end(product['id'], last=False)
+                self._trim(self._checked)
+    
+    def submit(self, product):
+        # Una sola verifica in corso per annuncio, anche se compare in più ricerche
+        with self._lock:
+            future = self._inflight.get(product['id'])
+            if future is None:
+                future = self._executor.submit(self._check, product['id'], product['link'])
+                self._inflight[product['id']] = future
+            return future
+    
+    def _check(self, product_id, link):
+        try:
+            status = detail_page_status(self.fetch(link))
+        except Exception as e:
+            logging.error(f"Errore durante la verifica dell'annuncio {link}: {e}")
+            status = None
+        
+        with self._lock:
+            self._inflight.pop(product_id, None)
+            if status == "sold":
+                self._checked.pop(product_id, None)
+                self._sold[product_id] = None
+                self._trim(self._sold)
+            elif status == "available":
+                self._checked[product_id] = (time.monotonic(), link)
+                self._checked.move_to_end(product_id)
+                self._trim(self._checked)
+            elif product_id not in self._checked:
+                # Verifica non riuscita: l'annuncio resta valido e viene ricontrollato
+                self._checked[product_id] = (float("-inf"), link)
+                self._checked.move_to_end(product_id, last=False)
+                self._trim(self._checked)
+        
+        if self.metrics:
+            self.metrics.inc("subito_sold_checks_total", result=status or "error")
+        return status
+    
+    def _trim(self, entries):
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+    
+    def recheck(self):
+        # Ricontrolla un numero limitato di annunci con la verifica scaduta, dal più vecchio
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for product_id, (checked, link) in self._checked.items():
+                if len(due) >= self.recheck_batch or now - checked < self.ttl_seconds:
+                    break
+                due.append({'id': product_id, 'link': link})
+        if not due:
+            return 0
+        
+        statuses = [future.result() for future in [self.submit(product) for product in due]]
+        sold = statuses.count("sold")
+        logging.info(f"Ricontrollati {len(due)} annunci sulla pagina di dettaglio, {sold} risultano venduti")
+        return sold
+    
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# Pianificatore basato su una coda a priorità di scadenze. Le ricerche scadute
+# vengono eseguite da un pool di thread limitato; se l'esecuzione precedente
+# di una ricerca è ancora in corso, il turno viene saltato.
+class SearchScheduler:
+    def __init__(self, max_workers=4, on_dispatch=None):
+        self.on_dispatch = on_dispatch
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="search")
+        self._condition = threading.Condition()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._stopped = False
+    
+    def add_job(self, name, interval_seconds, func, first_delay=0):
+        # Il nome serve per log e metriche; il turno saltato dipende solo dal job stesso
+        job = {"name": name, "interval": interval_seconds, "func": func, "lag": 0.0, "running": False}
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + first_delay, next(self._sequence), job))
+            self._condition.notify()
+        return job
+    
+    def run_forever(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                
+                deadline, _, job = self._heap[0]
+                now = time.monotonic()
+                if deadline > now:
+                    self._condition.wait(deadline - now)
+                    continue
+                
+                heapq.heappop(self._heap)
+                
+                # La prossima scadenza segue il ritmo fisso dell'intervallo; se siamo
+                # rimasti indietro di più di un intervallo ripartiamo da adesso
+                next_deadline = deadline + job["interval"]
+                if next_deadline <= now:
+                    next_deadline = now + job["interval"]
+                heapq.heappush(self._heap, (next_deadline, next(self._sequence), job))
+                
+                if job["running"]:
+                    logging.warning(f"Controllo di '{job['name']}' ancora in corso, turno saltato")
+                    continue
+                
+                job["lag"] = now - deadline
+                job["running"] = True
+            
+            if job["lag"] > 1:
+                logging.info(f"Controllo di '{job['name']}' avviato con {job['lag']:.1f}s di ritardo")
+            if self.on_dispatch:
+                self.on_dispatch(job["name"], job["lag"])
+            self._executor.submit(self._run_job, job)
+    
+    def _run_job(self, job):
+        try:
+            job["func"]()
+        except Exception as e:
+            logging.error(f"Errore nel job '{job['name']}': {e}")
+        finally:
+            with self._condition:
+                job["running"] = False
+    
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class PriceMonitor:
+    def __init__(self, config=None):
+        self.config = config if config is not None else self._load_config()
+        assign_search_ids(self.config.get("searches", []))
+        self.http_config = {**DEFAULT_HTTP_CONFIG, **self.config.get("http", {})}
+        self.parser_engine = self._select_parser_engine()
+        self.page_parser = PageParser(self.parser_engine, self.config.get("parser", {}).get("embedded_json", True))
+        self._layouts = OrderedDict()    # Impronte di layout già viste, dalla meno recente
+        self._layout_lock = threading.Lock()
+        self.parse_pool = self._open_parse_pool()
+        self.scheduler_config = {**DEFAULT_SCHEDULER_CONFIG, **self.config.get("scheduler", {})}
+        
+        # Metriche interne, endpoint opzionale e profilazione su richiesta
+        self.metrics = Metrics()
+        self.metrics_config = {**DEFAULT_METRICS_CONFIG, **self.config.get("metrics", {})}
+        self.metrics_server = None
+        self._profile_lock = threading.Lock()
+        self._profile_requests = set()
+        self._profiled = set()
+        self.scheduler = None
+        self.store = self._open_store()
+        self.analytics = self._open_analytics()
+        self.notifier = self._open_notifier()
+        self.sold_verifier = self._open_sold_verifier()
+        
+        # Cache condivise tra le ricerche: HTML scaricato e prodotti analizzati
+        cache_config = {**DEFAULT_CACHE_CONFIG, **self.config.get("cache", {})}
+        self.html_cache = None
+        self.parsed_cache = None
+        if cache_config["enabled"]:
+            self.html_cache = TTLCache(cache_config["ttl_seconds"], cache_config["max_pages"], cacheable=lambda value: isinstance(value, str))
+            self.parsed_cache = TTLCache(cache_config["ttl_seconds"], cache_config["max_parsed"])
+        self.snapshots = self._open_snapshots()
+        
+        # Stato della scansione incrementale per ogni ricerca
+        self.incremental_config = {**DEFAULT_INCREMENTAL_CONFIG, **self.config.get("incremental", {})}
+        self._incremental_lock = threading.Lock()
+        self._incremental_seen = {}
+        self._incremental_cycles = {}
+        
+        # Stato condiviso per limitare le richieste verso ogni host
+        self._host_lock = threading.Lock()
+        self._host_semaphores = {}
+        self._host_limiters = {}
+        self.rate_limit_config = {**DEFAULT_RATE_LIMIT_CONFIG, **self.config.get("rate_limit", {})}
+        
+        # Sessione HTTP condivisa per riutilizzare le connessioni
+        self.session = self._create_session()
+        
+        # Validatori (ETag/Last-Modified) e prodotti già analizzati per ogni URL
+        self._cache_lock = threading.Lock()
+        self._validators = {}
+        self._page_products = {}
+        self._feed_matchers = {}
+        
+    def _load_config(self):
+        if not os.path.exists(CONFIG_FILE):
+            with open(CONFIG_FILE, 'w') as f:
+                json.dump(DEFAULT_CONFIG, f, indent=4)
+            logging.info(f"Creato file di configurazione {CONFIG_FILE} con impostazioni predefinite")
+            return DEFAULT_CONFIG
+        
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.error(f"Errore nel caricamento del file di configurazione: {e}")
+            return DEFAULT_CONFIG
+    
+    def _open_store(self):
+        database_config = self.config.get("database", {})
+        if not database_config.get("enabled", True):
+            return None
+        
+        try:
+            return PriceStore(
+                database_config.get("file", "price_history.db"),
+                history_days=database_config.get("history_days", 30),
+                history_max_points=database_config.get("history_max_points", 200000)
+            )
+        except sqlite3.Error as e:
+            logging.error(f"Impossibile aprire il database dei prezzi: {e}")
+            return None
+    
+    def _open_analytics(self):
+        analytics_config = {**DEFAULT_ANALYTICS_CONFIG, **self.config.get("analytics", {})}
+        if not analytics_config["enabled"] or not self.store:
+            return None
+        if price_analytics is None:
+            logging.warning("Statistiche di mercato disattivate: numpy non è installato")
+            return None
+        if not self.store.history_days:
+            logging.warning("Statistiche di mercato disattivate: richiedono lo storico in memoria (history_days)")
+            return None
+        return price_analytics.MarketAnalytics(
+            self.store,
+            window_days=analytics_config["window_days"],
+            min_listings=analytics_config["min_listings"]
+        )
+    
+    def _open_notifier(self):
+        notification_config = {**DEFAULT_NOTIFICATION_CONFIG, **self.config.get("notification", {})}
+        if not notification_config["enabled"]:
+            return None
+        
+        # Senza database non è possibile distinguere gli annunci nuovi
+        if not self.store:
+            logging.warning("Notifiche disattivate: richiedono il database dei prezzi")
+            return None
+        
+        methods = notification_config.get("method", [])
+        if isinstance(methods, str):
+            methods = [methods]
+        
+        channels = []
+        for method in methods:
+            channel_class = NOTIFICATION_CHANNELS.get(method)
+            if channel_class is None:
+                logging.error(f"Metodo di notifica sconosciuto: {method}")
+                continue
+            channels.append(channel_class(notification_config.get(method, {}), notification_config["timeout"]))
+        
+        if not channels:
+            return None
+        return NotificationDispatcher(channels, notification_config, on_delivered=self.store.mark_notified, metrics=self.metrics)
+    
+    def _open_sold_verifier(self):
+        verification_config = {**DEFAULT_SOLD_VERIFICATION_CONFIG, **self.config.get("sold_verification", {})}
+        if not verification_config["enabled"]:
+            return None
+        if not self.store:
+            logging.warning("Senza database dei prezzi gli annunci nuovi non sono riconoscibili: verranno verificati solo dal ricontrollo periodico")
+        # Le pagine di dettaglio non usano richieste condizionali: la freschezza
+        # delle verifiche dipende dal TTL del SoldVerifier, non dai validatori
+        return SoldVerifier(
+            lambda url: self._fetch_with_host_limit(url, store_validators=False),
+            verification_config,
+            metrics=self.metrics
+        )
+    
+    def _open_snapshots(self):
+        snapshot_config = {**DEFAULT_SNAPSHOT_CONFIG, **self.config.get("snapshots", {})}
+        if not snapshot_config["enabled"]:
+            return None
+        return SnapshotArchive(
+            snapshot_config["directory"],
+            mode=snapshot_config["mode"],
+            max_bytes=snapshot_config["max_bytes"],
+            max_files=snapshot_config["max_files"]
+        )
+    
+    def _select_parser_engine(self):
+        requested = self.config.get("parser", {}).get("engine", "auto")
+        
+        if requested != "auto":
+            if requested in PARSER_ENGINES and builder_registry.lookup(requested):
+                return requested
+            logging.warning(f"Motore di parsing '{requested}' non disponibile, uso il primo disponibile")
         
-    def _load_config(self):
-        if not os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(DEFAULT_CONFIG, f, indent=4)
-            logging.info(f"Creato file di configurazione {CONFIG_FILE} con impostazioni predefinite")
-            return DEFAULT_CONFIG
+        for engine in PARSER_ENGINES:
+            if builder_registry.lookup(engine):
+                return engine
+        return "html.parser"
+    
+    def _open_parse_pool(self):
+        pool_config = {**DEFAULT_PARSE_POOL_CONFIG, **self.config.get("parse_pool", {})}
+        if not pool_config["enabled"]:
+            return None
+        
+        workers = pool_config["workers"] or os.cpu_count() or 1
+        options = {
+            "max_workers": workers,
+            "initializer": _init_parse_worker,
+            "initargs": (self.parser_engine, self.page_parser.embedded_json)
+        }
+        # I worker vengono sostituiti dopo max_tasks_per_child pagine per limitare la crescita della memoria
+        if pool_config["max_tasks_per_child"]:
+            options["max_tasks_per_child"] = pool_config["max_tasks_per_child"]
         
         try:
-            with open(CONFIG_FILE, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logging.error(f"Errore nel caricamento del file di configurazione: {e}")
-            return DEFAULT_CONFIG
+            pool = ProcessPoolExecutor(**options)
+        except TypeError:
+            # max_tasks_per_child richiede Python 3.11
+            logging.warning("Riciclo dei worker di parsing non supportato da questa versione di Python")
+            options.pop("max_tasks_per_child", None)
+            pool = ProcessPoolExecutor(**options)
+        
+        logging.info(f"Parsing delle pagine su {workers} processi")
+        return pool
     
-    def _get_page_content(self, url):
-        headers = {
+    def _create_session(self):
+        session = requests.Session()
+        pool_size = max(1, self.http_config["pool_size"])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
             "User-Agent": self.config["user_agent"],
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
             "Accept-Language": "it-IT,it;q=0.8,en-US;q=0.5,en;q=0.3",
             "Referer": "https://www.subito.it/",
             "Connection": "keep-alive"
-        }
+        })
+        return session
+    
+    def _get_page_content(self, url, conditional=False, store_validators=True):
+        headers = {}
+        
+        # Invia i validatori salvati solo se abbiamo già i prodotti della pagina
+        if conditional:
+            with self._cache_lock:
+                validators = self._validators.get(url, {})
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        
+        limiter = self._host_limiter(urlparse(url).netloc)
+        max_retries = self.rate_limit_config["max_retries"]
+        
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            retry_after = None
+            
+            try:
+                start = time.perf_counter()
+                response = self.session.get(url, headers=headers, timeout=self.http_config["timeout"])
+                host = urlparse(url).netloc
+                self.metrics.observe("subito_fetch_seconds", time.perf_counter() - start, host=host)
+                self.metrics.observe("subito_fetch_bytes", len(response.content), host=host)
+                self.metrics.inc("subito_fetch_responses_total", status=str(response.status_code))
+                
+                if response.status_code == 304:
+                    limiter.on_success()
+                    logging.info(f"Pagina non modificata (304): {url}")
+                    return NOT_MODIFIED
+                
+                if response.status_code in RETRY_STATUS_CODES:
+                    # Retry-After è limitato a backoff_max: l'attesa avviene con il semaforo dell'host occupato
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if retry_after is not None:
+                        retry_after = min(retry_after, self.rate_limit_config["backoff_max"])
+                    limiter.on_throttle(retry_after)
+                    error = f"HTTP {response.status_code}"
+                else:
+                    response.raise_for_status()
+                    limiter.on_success()
+                    
+                    if self.http_config["conditional_requests"] and store_validators:
+                        etag = response.headers.get("ETag")
+                        last_modified = response.headers.get("Last-Modified")
+                        with self._cache_lock:
+                            if etag or last_modified:
+                                self._validators[url] = {"etag": etag, "last_modified": last_modified}
+                            else:
+                                self._validators.pop(url, None)
+                    
+                    return response.text
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                self.metrics.inc("subito_fetch_responses_total", status="timeout" if isinstance(e, requests.exceptions.Timeout) else "connection_error")
+                limiter.on_throttle()
+                error = str(e)
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Errore durante il recupero della pagina: {e}")
+                return None
+            
+            if attempt == max_retries:
+                break
+            
+            # Backoff esponenziale con jitter, oppure l'attesa indicata dal server
+            delay = retry_after if retry_after is not None else random.uniform(
+                0, min(self.rate_limit_config["backoff_max"], self.rate_limit_config["backoff_base"] * 2 ** attempt)
+            )
+            logging.warning(f"Errore temporaneo ({error}) per {url}, nuovo tentativo tra {delay:.1f}s ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
+        
+        logging.error(f"Errore durante il recupero della pagina dopo {max_retries + 1} tentativi: {error}")
+        return None
+    
+    def _host_limiter(self, host):
+        with self._host_lock:
+            limiter = self._host_limiters.get(host)
+            if limiter is None:
+                config = self.rate_limit_config
+                limiter = AdaptiveRateLimiter(
+                    config["requests_per_second"],
+                    config["burst"],
+                    min_rate=config["min_rate"],
+                    max_rate=config["max_rate"],
+                    adaptive=config["adaptive"]
+                )
+                self._host_limiters[host] = limiter
+            return limiter
+    
+    def _fetch_with_host_limit(self, url, conditional=False, store_validators=True):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(max(1, self.http_config["max_concurrency_per_host"]))
+                self._host_semaphores[host] = semaphore
+        
+        with semaphore:
+            return self._get_page_content(url, conditional, store_validators)
+    
+    def _iter_pages(self, page_urls, product_name, first_page=1, batch_pages=None):
+        # Restituisce i prodotti di ogni pagina nello stesso ordine degli URL, appena
+        # la pagina è pronta; le pagine successive continuano a scaricarsi in parallelo.
+        # Con batch_pages la prima pagina viene scaricata da sola e le successive a gruppi
+        # di batch_pages, avviati solo quando il chiamante chiede la pagina seguente.
+        pages = list(range(first_page, first_page + len(page_urls)))
         
+        if not self.http_config["concurrent"] or len(page_urls) <= 1:
+            for url, page in zip(page_urls, pages):
+                yield self._load_page_products(url, product_name, page)
+            return
+        
+        max_workers = min(len(page_urls), max(1, self.http_config["max_concurrency_per_host"]))
+        executor = ThreadPoolExecutor(max_workers=max_workers)
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            return response.text
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Errore durante il recupero della pagina: {e}")
-            return None
+            if not batch_pages:
+                yield from executor.map(self._load_page_products, page_urls, [product_name] * len(page_urls), pages)
+                return
+            
+            start, size = 0, 1
+            while start < len(page_urls):
+                end = start + size
+                yield from executor.map(self._load_page_products, page_urls[start:end], [product_name] * len(page_urls[start:end]), pages[start:end])
+                start, size = end, max(1, batch_pages)
+        finally:
+            # Se la scansione si interrompe prima, le pagine non ancora avviate vengono annullate
+            executor.shutdown(wait=True, cancel_futures=True)
     
-    def _parse_products(self, html_content, product_name):
-        products = []
-        soup = BeautifulSoup(html_content, 'html.parser')
+    def _load_page_products(self, page_url, product_name, page=1):
+        # Ricerche diverse sulla stessa pagina condividono download e analisi
+        if self.parsed_cache is None:
+            return self._fetch_and_parse(page_url, product_name, page)
         
-        # Salva la struttura HTML per ispezione in caso di debug
-        with open("subito_debug.html", "w", encoding="utf-8") as f:
-            f.write(html_content)
-        logging.info("HTML salvato in 'subito_debug.html' per ispezione")
+        key = (normalize_page_url(page_url), product_name.lower() if product_name is not None else None)
+        return self.parsed_cache.get_or_load(key, lambda: self._fetch_and_parse(page_url, product_name, page))
+    
+    def _fetch_and_parse(self, page_url, product_name, page=1):
+        # Richiesta condizionale solo per le pagine di cui conosciamo già i prodotti
+        with self._cache_lock:
+            conditional = self.http_config["conditional_requests"] and (page_url, product_name) in self._page_products
         
-        # Selettori aggiornati basati sull'HTML fornito
-        # Cerchiamo le SmallCard che sono i container dei prodotti
-        selectors = [
-            'div.SmallCard-module_picture-group__asLo2',  # Contenitore intero della card
-            'div.SmallCard-module_item-key-data__fcbjY',  # Contenitore dei dati principali
-            'a.SmallCard-module_link__hOkzY',             # Link dell'annuncio
-            'a.ItemCard-module_card__Gy7SX',              # Possibile alternativa
-            'div[class*="SmallCard-module"]',             # Qualsiasi div con classe che contiene SmallCard-module
-            'div[class*="ItemCard-module"]'               # Qualsiasi div con classe che contiene ItemCard-module
-        ]
+        html_content = self._cached_page_content(page_url, conditional)
+        return self._page_products_for(page_url, html_content, product_name, page)
+    
+    def _cached_page_content(self, url, conditional=False):
+        if self.html_cache is None:
+            return self._fetch_with_host_limit(url, conditional)
+        return self.html_cache.get_or_load(normalize_page_url(url), lambda: self._fetch_with_host_limit(url, conditional))
+    
+    def cache_stats(self):
+        return {
+            "html": self.html_cache.stats() if self.html_cache else None,
+            "parsed": self.parsed_cache.stats() if self.parsed_cache else None
+        }
+    
+    def _parse_products(self, html_content, product_name, page=1):
+        # Con product_name None (feed condiviso) non viene applicato il filtro di pertinenza.
+        # Con il pool attivo il thread chiamante attende il worker senza occupare il GIL.
+        result = None
+        if self.parse_pool:
+            try:
+                result = self.parse_pool.submit(_parse_in_worker, html_content, product_name).result()
+            except BrokenProcessPool as e:
+                logging.error(f"Pool di parsing non disponibile, analisi nel processo principale: {e}")
+        if result is None:
+            result = self.page_parser.parse(html_content, product_name)
         
-        # Proviamo a trovare tutti i container di annunci
-        all_items = []
-        for selector in selectors:
-            items = soup.select(selector)
-            if items:
-                logging.info(f"Trovati {len(items)} elementi con selettore: {selector}")
-                all_items.extend(items)
-                # Continuiamo a cercare con altri selettori per trovare più prodotti possibili
+        self._record_parse(result, html_content, product_name, page)
+        return result["products"]
+    
+    def parse_many(self, pages):
+        # Analizza molte pagine (html, nome ricerca, numero pagina) inviandole al pool a gruppi di chunk_size
+        if self.parse_pool:
+            chunk_size = max(1, self.config.get("parse_pool", {}).get("chunk_size", DEFAULT_PARSE_POOL_CONFIG["chunk_size"]))
+            htmls = [html_content for html_content, _, _ in pages]
+            names = [product_name for _, product_name, _ in pages]
+            results = list(self.parse_pool.map(_parse_in_worker, htmls, names, chunksize=chunk_size))
+        else:
+            results = [self.page_parser.parse(html_content, product_name) for html_content, product_name, _ in pages]
         
-        # Rimuovi duplicati preservando l'ordine
-        seen = set()
-        unique_items = []
-        for item in all_items:
-            item_str = str(item)
-            if item_str not in seen:
-                seen.add(item_str)
-                unique_items.append(item)
+        for result, (html_content, product_name, page) in zip(results, pages):
+            self._record_parse(result, html_content, product_name, page)
+        return [result["products"] for result in results]
+    
+    def _record_parse(self, result, html_content, product_name, page):
+        # Metriche e archivio restano nel processo principale
+        self.metrics.observe("subito_parse_seconds", result["seconds"], path=result["path"])
+        logging.debug(f"Pagina {page} analizzata in {result['seconds']:.3f}s ({result['path']}): {len(result['products'])} prodotti", extra={"search": product_name, "page": page, "duration": round(result["seconds"], 4)})
+        for selector, count in result["selector_matches"].items():
+            self.metrics.inc("subito_selector_matches_total", count, selector=selector)
+        for reason, count in result["drops"].items():
+            self.metrics.inc("subito_products_dropped_total", count, search=product_name or "feed", reason=reason)
+        if result["layout"]:
+            self._check_layout(result["layout"])
         
-        logging.info(f"Trovati {len(unique_items)} elementi unici per analisi")
+        # Archivia la pagina per il debug (di default solo se non contiene annunci)
+        if self.snapshots:
+            self.snapshots.capture(html_content, product_name or "feed", page, result["items_found"])
+    
+    def _check_layout(self, fingerprint):
+        # Un rilascio del sito cambia i suffissi delle classi delle card: un'impronta
+        # nuova quando ne conosciamo già altre è un cambio di layout, non un primo avvio
+        with self._layout_lock:
+            if fingerprint in self._layouts:
+                self._layouts.move_to_end(fingerprint)
+                return
+            known_layouts = len(self._layouts)
+            self._layouts[fingerprint] = True
+            while len(self._layouts) > MAX_KNOWN_LAYOUTS:
+                self._layouts.popitem(last=False)
         
-        # Se non abbiamo trovato elementi con i selettori specifici, cerchiamo tutte le card possibili
-        if not unique_items:
-            logging.warning("Nessun elemento trovato con i selettori noti. Tentativo con metodo alternativo...")
-            
-            # Cerchiamo tutti i possibili container di card in base al modello fornito
-            potential_items = soup.find_all(['div', 'a'], class_=re.compile(r'(SmallCard|ItemCard|Card)'))
-            
-            for item in potential_items:
-                item_str = str(item)
-                if item_str not in seen:
-                    seen.add(item_str)
-                    unique_items.append(item)
+        if known_layouts:
+            logging.warning(f"Layout della pagina cambiato: nuova impronta {fingerprint} ({known_layouts} layout già noti), verificare i selettori delle card")
+            self.metrics.inc("subito_layout_changes_total")
+        else:
+            logging.info(f"Impronta del layout delle pagine: {fingerprint}")
+    
+    def _page_products_for(self, page_url, html_content, product_name, page=1):
+        # Restituisce i prodotti della pagina o None se non è stato possibile scaricarla
+        cache_key = (page_url, product_name)
+        if html_content is NOT_MODIFIED:
+            # Pagina invariata: riutilizziamo i prodotti analizzati in precedenza
+            with self._cache_lock:
+                products = self._page_products.get(cache_key)
+            if products is not None:
+                return products
             
-            logging.info(f"Trovati {len(unique_items)} elementi con metodo alternativo")
+            # Risposta 304 ottenuta da un'altra ricerca: serve il contenuto completo
+            html_content = self._fetch_with_host_limit(page_url)
         
-        # Prepara il termine di ricerca per verificare la pertinenza
-        search_terms = product_name.lower().split()
+        if not html_content:
+            return None
         
-        # Analizza ogni elemento trovato
-        for item in unique_items:
-            try:
-                # Controlla se l'elemento o uno dei suoi genitori contiene l'indicatore "Venduto"
-                # 1. Cerca span con classe "item-sold-badge" e testo "Venduto"
-                sold_badge = item.find('span', class_=re.compile(r'item-sold-badge'))
-                if sold_badge and 'Venduto' in sold_badge.get_text():
-                    logging.debug("Prodotto ignorato perché contiene badge 'Venduto'")
-                    continue
-                
-                # 2. Cerca l'articolo notice con testo che indica che l'oggetto è stato venduto
-                sold_notice = item.find('article', class_=re.compile(r'notice-module_notice'))
-                if sold_notice and 'concluso la trattativa' in sold_notice.get_text():
-                    logging.debug("Prodotto ignorato perché contiene avviso di vendita conclusa")
-                    continue
-                
-                # 3. Cerca qualsiasi elemento con la classe che contiene "no-item-available"
-                no_item_element = item.find(class_=re.compile(r'no-item-available'))
-                if no_item_element:
-                    logging.debug("Prodotto ignorato perché contiene classe 'no-item-available'")
-                    continue
-                
-                # 4. Cerca nel testo generale del prodotto
-                item_text = item.get_text().lower()
-                if 'venduto' in item_text and ('concluso' in item_text or 'trattativa' in item_text):
-                    logging.debug("Prodotto ignorato perché contiene testo che indica vendita conclusa")
-                    continue
-                
-                # Cerchiamo il titolo usando il selettore esatto
-                title_element = item.find('h2', class_=re.compile(r'ItemTitle-module_item-title__'))
-                
-                # Se non troviamo il titolo con il selettore specifico, proviamo selettori alternativi
-                if not title_element:
-                    title_element = item.find(['h2', 'h3', 'h4'], class_=re.compile(r'(title|item-title)'))
-                
-                # Se ancora non troviamo, cerchiamo all'interno dell'elemento o nei suoi genitori
-                if not title_element:
-                    # Cerca in questo elemento e nei suoi genitori
-                    parent = item
-                    for _ in range(3):  # Limita la ricerca a 3 livelli di genitori
-                        if parent:
-                            title_element = parent.find(['h2', 'h3', 'h4'])
-                            if title_element:
-                                break
-                            parent = parent.parent
-                
-                # Se non troviamo ancora un titolo, passiamo all'elemento successivo
-                if not title_element:
-                    continue
-                
-                title = title_element.get_text().strip()
-                
-                # Verifica se il testo del titolo contiene indicazioni che l'oggetto è venduto
-                if 'venduto' in title.lower():
-                    logging.debug(f"Prodotto ignorato perché il titolo contiene 'venduto': {title}")
-                    continue
-                
-                # Verifica la pertinenza del prodotto rispetto alla ricerca
-                title_lower = title.lower()
-                is_relevant = any(term in title_lower for term in search_terms)
-                
-                if not is_relevant and len(search_terms) > 1:
-                    # Se non troviamo corrispondenze esatte, controlliamo se almeno il 50% dei termini è presente
-                    matches = sum(1 for term in search_terms if term in title_lower)
-                    is_relevant = matches / len(search_terms) >= 0.5
-                
-                if not is_relevant:
-                    logging.debug(f"Prodotto ignorato (non pertinente): {title}")
-                    continue
-                
-                # Estrai il prezzo usando il selettore esatto
-                price_element = item.find('p', class_=re.compile(r'index-module_price__N7M2x'))
-                
-                # Se non troviamo il prezzo con il selettore specifico, proviamo selettori alternativi
-                if not price_element:
-                    price_element = item.find(['p', 'div', 'span'], class_=re.compile(r'price'))
-                
-                # Se ancora non troviamo, cerchiamo all'interno dell'elemento e anche nei genitori
-                if not price_element:
-                    # Cerca in questo elemento
-                    parent = item
-                    for _ in range(3):  # Limita la ricerca a 3 livelli di genitori
-                        if parent:
-                            price_element = parent.find(['p', 'div', 'span'], class_=re.compile(r'price'))
-                            if price_element:
-                                break
-                            parent = parent.parent
-                
-                # Se non troviamo un prezzo, cerca nel testo dell'intero elemento
-                if not price_element:
-                    all_text = item.get_text()
-                    price_matches = re.findall(r'(\d{1,3}(?:\.\d{3})*(?:,\d{1,2})?)\s*€|\€\s*(\d{1,3}(?:\.\d{3})*(?:,\d{1,2})?)', all_text)
-                    
-                    # Appiattisci la lista di tuple e rimuovi stringhe vuote
-                    price_candidates = [p for group in price_matches for p in group if p]
-                    
-                    if price_candidates:
-                        price_text = price_candidates[0]
-                    else:
-                        continue  # Nessun prezzo trovato
-                else:
-                    # Ottieni il testo del prezzo e rimuovi elementi figli (come badge di spedizione)
-                    price_text = ''.join([text for text in price_element.contents if isinstance(text, str)]).strip()
-                    
-                    # Se non abbiamo testo diretto, usa il testo completo
-                    if not price_text:
-                        price_text = price_element.get_text().strip()
-                    
-                    # Controlla se l'elemento del prezzo ha un badge "Venduto" come figlio
-                    if price_element:
-                        badge = price_element.find(class_=re.compile(r'(badge|item-sold)'))
-                        if badge and 'venduto' in badge.get_text().lower():
-                            logging.debug(f"Prodotto ignorato perché il prezzo contiene badge 'Venduto': {title}")
-                            continue
-                
-                # Estrai il prezzo dal testo
-                price_match = re.search(r'(\d{1,3}(?:\.\d{3})*(?:,\d{1,2})?)', price_text)
-                if not price_match:
-                    continue
-                
-                price_text = price_match.group(1)
-                
-                # Pulizia e conversione del prezzo
-                price_text = price_text.replace('.', '').replace(',', '.').strip()
-                
-                try:
-                    price = float(price_text)
-                except ValueError:
-                    logging.debug(f"Impossibile convertire il prezzo '{price_text}' per: {title}")
-                    continue
-                
-                # Estrai il link
-                link = None
-                
-                # Se l'elemento stesso è un link
-                if item.name == 'a' and item.has_attr('href'):
-                    link = item['href']
+        products = self._parse_products(html_content, product_name, page)
+        
+        # Memorizziamo i prodotti solo se il server ha fornito dei validatori
+        if self.http_config["conditional_requests"]:
+            with self._cache_lock:
+                if page_url in self._validators:
+                    self._page_products[cache_key] = products
                 else:
-                    # Cerca un link all'interno dell'elemento o nei suoi genitori
-                    link_element = item.find('a', href=True)
-                    
-                    if not link_element:
-                        # Cerca nei genitori
-                        parent = item.parent
-                        while parent and parent.name != 'html':
-                            if parent.name == 'a' and parent.has_attr('href'):
-                                link_element = parent
-                                break
-                            parent = parent.parent
-                    
-                    if link_element:
-                        link = link_element['href']
+                    self._page_products.pop(cache_key, None)
+        
+        return products
+    
+    def _incremental_setting(self, search_config, key):
+        # Le impostazioni della singola ricerca hanno precedenza su quelle globali
+        return {**self.incremental_config, **search_config.get("incremental", {})}[key]
+    
+    def _incremental_known_ids(self, search_config):
+        # Restituisce gli ID già visti dalla ricerca, oppure None se serve una scansione completa
+        if not self._incremental_setting(search_config, "enabled"):
+            return None
+        
+        # Stato per ricerca e non per URL: ricerche sullo stesso URL con fasce di
+        # prezzo diverse hanno annunci noti e cicli di scansione completa separati
+        search_id = search_key(search_config)
+        with self._incremental_lock:
+            cycle = self._incremental_cycles.get(search_id, 0)
+            known_ids = self._incremental_seen.get(search_id)
+        
+        if known_ids is None and self.store:
+            # Primo ciclo dopo l'avvio: recuperiamo gli annunci salvati nel database
+            known_ids = self.store.seen_ids(search_id)
+            with self._incremental_lock:
+                self._incremental_seen[search_id] = known_ids
+        
+        # Il primo ciclo dopo un riavvio usa gli annunci del database e non è una scansione completa
+        full_sweep_every = self._incremental_setting(search_config, "full_sweep_every")
+        if not known_ids or (full_sweep_every and cycle and cycle % full_sweep_every == 0):
+            logging.info(f"Scansione completa di tutte le pagine per '{search_config['product_name']}'")
+            return None
+        
+        return known_ids
+    
+    def _incremental_update(self, search_config, products):
+        search_id = search_key(search_config)
+        with self._incremental_lock:
+            self._incremental_seen.setdefault(search_id, set()).update(product['id'] for product in products)
+    
+    def _incremental_next_cycle(self, search_config):
+        search_id = search_key(search_config)
+        with self._incremental_lock:
+            self._incremental_cycles[search_id] = self._incremental_cycles.get(search_id, 0) + 1
+    
+    def check_prices(self, search_config):
+        search_id = search_key(search_config)
+        start = time.perf_counter()
+        
+        # Profilazione su richiesta di un singolo ciclo della ricerca, per id o per nome del prodotto
+        if self._take_profile_request(search_id, (search_config["product_name"],)):
+            valid_products = self._profile_cycle(search_id, self._check_prices, search_config)
+        else:
+            valid_products = self._check_prices(search_config)
+        
+        duration = time.perf_counter() - start
+        self.metrics.observe("subito_search_cycle_seconds", duration, search=search_id)
+        logging.info(f"Controllo di '{search_id}' completato in {duration:.2f}s", extra={"search": search_id, "duration": round(duration, 3)})
+        return valid_products
+    
+    def _check_prices(self, search_config):
+        product_name = search_config["product_name"]
+        min_price = search_config.get("min_price", 0)
+        max_price = search_config["max_price"]
+        
+        logging.info(f"Controllo dei prezzi per '{product_name}' (min €{min_price}, max €{max_price})...")
+        
+        # Pipeline a flusso: pagine -> prodotti -> deduplicazione -> filtri -> destinazioni
+        stats = Counter()
+        products = dedupe_products(self._stream_products(search_config), stats)
+        valid_products = self._finish_search(search_config, products)
+        logging.info(f"Filtrati a {stats['unique']} prodotti unici")
+        
+        self._incremental_next_cycle(search_config)
+        return valid_products
+    
+    def _stream_products(self, search_config):
+        # Scarica e analizza le pagine in ordine restituendo i prodotti appena disponibili
+        product_name = search_config["product_name"]
+        pages_to_check = search_config.get("pages_to_check", 1)
+        page_urls = [build_page_url(search_config["search_url"], page) for page in range(1, pages_to_check + 1)]
+        
+        # In modalità incrementale la paginazione si interrompe quando una pagina non porta annunci nuovi
+        known_ids = self._incremental_known_ids(search_config)
+        min_new_fraction = self._incremental_setting(search_config, "min_new_fraction")
+        batch_pages = self._incremental_setting(search_config, "batch_pages") if known_ids is not None else None
+        
+        if self.http_config["concurrent"]:
+            logging.info(f"Scaricamento parallelo di {pages_to_check} pagine per '{product_name}'")
+        
+        pages_checked = 0
+        products_found = 0
+        pages = self._iter_pages(page_urls, product_name, batch_pages=batch_pages)
+        try:
+            for page, (page_url, products) in enumerate(zip(page_urls, pages), start=1):
+                logging.info(f"Controllando pagina {page}/{pages_to_check}: {page_url}", extra={"search": product_name, "page": page})
+                pages_checked = page
                 
-                if not link:
+                if products is None:
+                    logging.error(f"Impossibile ottenere contenuti per '{product_name}' pagina {page}", extra={"search": product_name, "page": page})
                     continue
                 
-                # Assicurati che il link sia assoluto
-                if link and not link.startswith('http'):
-                    link = f"https://www.subito.it{link}"
-                
-                # Trova l'ID del prodotto
-                item_id = None
-                id_match = re.search(r'/(\d+)\.html', link)
-                if id_match:
-                    item_id = id_match.group(1)
-                else:
-                    item_id = link.split('/')[-1]
-                
-                # Estrai la location se disponibile
-                location_element = item.find(class_=re.compile(r'(PostingTimeAndPlace|town|city|location)'))
-                location = None
-                
-                if location_element:
-                    location = location_element.get_text().strip()
-                    # Pulisci la location da date o altre informazioni
-                    location = re.sub(r'\d+\s+\w+\s+alle\s+\d+:\d+', '', location).strip()
-                
-                # Estrai l'URL dell'immagine
-                img_element = item.find('img')
-                img_url = None
-                if img_element and img_element.has_attr('src'):
-                    img_url = img_element['src']
-                
-                products.append({
-                    'id': item_id,
-                    'title': title,
-                    'price': price,
-                    'link': link,
-                    'image': img_url,
-                    'location': location
-                })
+                products_found += len(products)
+                unseen = None
+                if known_ids is not None:
+                    unseen = sum(1 for product in products if product['id'] not in known_ids)
+                self._incremental_update(search_config, products)
                 
-                logging.debug(f"Estratto prodotto: {title} - €{price}")
+                yield from products
                 
-            except Exception as e:
-                logging.error(f"Errore durante l'analisi di un prodotto: {e}")
-                continue
+                if unseen is not None and (unseen == 0 or unseen / len(products) < min_new_fraction):
+                    logging.info(f"Scansione incrementale interrotta a pagina {page}/{pages_to_check} per '{product_name}': {unseen} annunci nuovi su {len(products)}")
+                    break
+        finally:
+            pages.close()
         
-        return products
+        logging.info(f"Trovati {products_found} prodotti totali su {pages_checked} pagine", extra={"search": product_name})
+        
+        if self.parsed_cache:
+            stats = self.cache_stats()
+            for cache_name, cache_stats in stats.items():
+                for key, value in cache_stats.items():
+                    self.metrics.set_gauge(f"subito_cache_{key}", value, cache=cache_name)
+            logging.info(f"Cache pagine: {stats['html']['hits']} hit / {stats['html']['misses']} miss, cache prodotti: {stats['parsed']['hits']} hit / {stats['parsed']['misses']} miss")
     
-    def check_prices(self, search_config):
+    def _finish_search(self, search_config, products):
+        # Porta i prodotti unici di una ricerca alle destinazioni: database (tutti),
+        # poi solo quelli nel range di prezzo a top-K, JSONL, notifiche e console
         product_name = search_config["product_name"]
-        search_url = search_config["search_url"]
+        search_id = search_key(search_config)
         min_price = search_config.get("min_price", 0)
         max_price = search_config["max_price"]
         results_limit = search_config.get("results_limit", 50)  # Numero massimo di risultati da mostrare
+        output_config = {**DEFAULT_OUTPUT_CONFIG, **self.config.get("output", {}), **search_config.get("output", {})}
         
-        logging.info(f"Controllo dei prezzi per '{product_name}' (min €{min_price}, max €{max_price})...")
-        
-        # Controlla se ci sono più pagine da controllare
-        pages_to_check = search_config.get("pages_to_check", 1)
-        all_products = []
-        
-        for page in range(1, pages_to_check + 1):
-            page_url = search_url
-            if page > 1:
-                # Aggiungi il parametro della pagina all'URL
-                if '?' in page_url:
-                    page_url += f"&o={page}"
-                else:
-                    page_url += f"?o={page}"
-            
-            logging.info(f"Controllando pagina {page}/{pages_to_check}: {page_url}")
-            
-            html_content = self._get_page_content(page_url)
-            if not html_content:
-                logging.error(f"Impossibile ottenere contenuti per '{product_name}' pagina {page}")
-                continue
-            
-            products = self._parse_products(html_content, product_name)
-            all_products.extend(products)
-            
-            # Breve pausa tra le pagine per non sovraccaricare il server
-            if page < pages_to_check:
-                time.sleep(2)
+        # Novità, ribassi e statistiche sono tenuti per ricerca: due ricerche dello
+        # stesso prodotto con fasce di prezzo diverse non condividono lo stato
+        store_sink = StoreSink(self.store, search_id) if self.store else None
+        top = TopKSink(results_limit)
+        sinks = [top]
+        if output_config["jsonl_file"]:
+            sinks.append(JsonlSink(output_config["jsonl_file"], search_id, self.analytics))
+        if self.analytics:
+            analytics_config = {**DEFAULT_ANALYTICS_CONFIG, **self.config.get("analytics", {})}
+            sinks.append(DealSink(self.analytics, search_id, analytics_config["deal_threshold"]))
+        if self.notifier:
+            sinks.append(NotifierSink(self.notifier, search_id, self.store))
+        if output_config["console"]:
+            sinks.append(ConsoleSink(top, product_name, min_price, max_price))
         
-        logging.info(f"Trovati {len(all_products)} prodotti totali su {pages_to_check} pagine")
+        counts = Counter()
+        try:
+            stream = track_changes(products, store_sink)
+            stream = filter_price(stream, min_price, max_price, counts)
+            if self.sold_verifier:
+                stream = verify_sold(stream, self.sold_verifier, counts)
+            for product, change in stream:
+                for sink in sinks:
+                    sink.emit(product, change)
+        finally:
+            # Salva prodotti e prezzi osservati in un'unica transazione per ciclo
+            if store_sink:
+                store_sink.close()
+            for sink in sinks:
+                sink.close()
         
-        # Rimuovi duplicati basati sull'ID
-        unique_products = {}
-        for product in all_products:
-            unique_products[product['id']] = product
-        
-        all_products = list(unique_products.values())
-        logging.info(f"Filtrati a {len(all_products)} prodotti unici")
-        
-        # Filtra prodotti nel range di prezzo desiderato
-        valid_products = []
-        for product in all_products:
-            # Verifica che il prezzo sia nel range specificato
-            price = product['price']
-            if min_price <= price <= max_price:
-                valid_products.append(product)
-                logging.debug(f"Prodotto valido: {product['title']} - €{price}")
-            else:
-                logging.debug(f"Prodotto fuori range di prezzo: {product['title']} - €{price} (range: €{min_price}-€{max_price})")
+        # Aggiorna la distribuzione dei prezzi usata per valutare il ciclo successivo
+        if self.analytics:
+            self.analytics.refresh(search_id, store_sink.prices)
         
-        # Ordina i prodotti per prezzo crescente
-        valid_products.sort(key=lambda x: x['price'])
+        valid_products = top.results()
+        self.metrics.inc("subito_products_dropped_total", counts["out_of_range"], search=search_id, reason="out_of_range")
+        self.metrics.inc("subito_products_dropped_total", counts["sold"], search=search_id, reason="sold_detail")
+        self.metrics.inc("subito_products_dropped_total", counts["in_range"] - counts["sold"] - len(valid_products), search=search_id, reason="over_limit")
+        self.metrics.inc("subito_products_kept_total", len(valid_products), search=search_id)
         
-        # Limita il numero di risultati
-        valid_products = valid_products[:results_limit]
+        if store_sink:
+            logging.info(f"{store_sink.new_count} prodotti nuovi e {store_sink.drop_count} ribassati per '{search_id}'")
+        logging.info(f"Trovati {counts['in_range'] + counts['out_of_range']} prodotti per '{product_name}', di cui {counts['in_range']} nel range di prezzo €{min_price}-€{max_price}")
         
-        logging.info(f"Trovati {len(all_products)} prodotti per '{product_name}', di cui {len(valid_products)} nel range di prezzo €{min_price}-€{max_price}")
+        return valid_products
+    
+    def check_feed(self, feed_url, searches):
+        start = time.perf_counter()
         
-        # Stampa i prodotti validi
-        if valid_products:
-            print(f"\nRisultati per '{product_name}' (range €{min_price}-€{max_price}):")
-            print("-" * 80)
-            for i, product in enumerate(valid_products):
-                location_info = f" - {product['location']}" if product.get('location') else ""
-                print(f"{i+1}. {product['title']} - €{product['price']}{location_info}")
-                print(f"   🔗 {product['link']}")
-                print()
+        # Il feed si profila come un unico job, richiesto per URL o per una delle sue ricerche
+        names = [name for search_config in searches for name in (search_key(search_config), search_config["product_name"])]
+        if self._take_profile_request(feed_url, names):
+            results = self._profile_cycle(feed_url, self._check_feed, feed_url, searches)
         else:
-            print(f"\nNessun prodotto trovato per '{product_name}' nel range di prezzo €{min_price}-€{max_price}")
+            results = self._check_feed(feed_url, searches)
         
-        return valid_products
+        self.metrics.observe("subito_search_cycle_seconds", time.perf_counter() - start, search=feed_url)
+        return results
+    
+    def _check_feed(self, feed_url, searches):
+        # Scarica e analizza una sola volta il feed condiviso, poi assegna ogni
+        # annuncio alle ricerche pertinenti e applica a ciascuna i propri filtri
+        names = [search_config["product_name"] for search_config in searches]
+        logging.info(f"Controllo del feed {feed_url} per {len(searches)} ricerche: {', '.join(names)}")
+        
+        pages_to_check = max(search_config.get("pages_to_check", 1) for search_config in searches)
+        page_urls = [build_page_url(feed_url, page) for page in range(1, pages_to_check + 1)]
+        
+        unique_products = {}
+        for page, products in enumerate(self._iter_pages(page_urls, None), start=1):
+            if products is None:
+                logging.error(f"Impossibile ottenere contenuti per il feed {feed_url} pagina {page}")
+                continue
+            for product in products:
+                unique_products[product['id']] = product
+        
+        matcher = self._feed_matcher(names)
+        slices = [[] for _ in searches]
+        for product in unique_products.values():
+            for search_index in matcher.match(product['title']):
+                slices[search_index].append(product)
+        
+        logging.info(f"Trovati {len(unique_products)} prodotti unici nel feed {feed_url}")
+        
+        results = {}
+        for search_config, products in zip(searches, slices):
+            product_name = search_config["product_name"]
+            self.metrics.inc("subito_products_dropped_total", len(unique_products) - len(products), search=search_key(search_config), reason="irrelevant")
+            logging.info(f"{len(products)} prodotti del feed pertinenti per '{product_name}'")
+            results[search_key(search_config)] = self._finish_search(search_config, products)
+        return results
     
-    def run_scheduled_check(self):
+    def _feed_matcher(self, names):
+        # L'automa viene compilato una sola volta per ogni gruppo di ricerche
+        key = tuple(names)
+        with self._cache_lock:
+            matcher = self._feed_matchers.get(key)
+            if matcher is None:
+                matcher = self._feed_matchers[key] = SearchMatcher(names)
+        return matcher
+    
+    def _search_jobs(self):
+        # Le ricerche con lo stesso feed_url diventano un unico job; le altre restano singole
+        jobs = []
+        feeds = {}
         for search_config in self.config["searches"]:
-            self.check_prices(search_config)
+            feed_url = search_config.get("feed_url")
+            if feed_url:
+                feeds.setdefault(feed_url, []).append(search_config)
+            else:
+                jobs.append((
+                    search_key(search_config),
+                    search_config.get("check_interval_minutes", 30),
+                    lambda search_config=search_config: self._run_search_job(search_config)
+                ))
+        
+        for feed_url, searches in feeds.items():
+            # Il feed viene controllato con l'intervallo più breve del gruppo
+            interval_minutes = min(search_config.get("check_interval_minutes", 30) for search_config in searches)
+            jobs.append((
+                feed_url,
+                interval_minutes,
+                lambda feed_url=feed_url, searches=searches: self._run_feed_job(feed_url, searches)
+            ))
+        return jobs
+    
+    def _run_feed_job(self, feed_url, searches):
+        try:
+            return self.check_feed(feed_url, searches)
+        except Exception as e:
+            logging.error(f"Errore durante il controllo del feed {feed_url}: {e}")
+            return {}
+    
+    def request_profile(self, product_name=None):
+        # Profila il prossimo ciclo della ricerca indicata (o di tutte se None)
+        with self._profile_lock:
+            self._profile_requests.add(product_name or "*")
+        logging.info(f"Profilazione richiesta per il prossimo ciclo di '{product_name or 'tutte le ricerche'}'")
+    
+    def _take_profile_request(self, job_name, product_names=()):
+        with self._profile_lock:
+            requested = self._profile_requests & {job_name, *product_names}
+            if requested:
+                self._profile_requests -= requested
+                return True
+            
+            # La richiesta generica resta attiva finché ogni job (ricerca o feed) non è stato profilato
+            if "*" in self._profile_requests and job_name not in self._profiled:
+                self._profiled.add(job_name)
+                if len(self._profiled) >= len(self._search_jobs()):
+                    self._profile_requests.discard("*")
+                    self._profiled.clear()
+                return True
+        return False
+    
+    def _profile_cycle(self, job_name, func, *args):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args)
+        finally:
+            profiler.disable()
+            directory = self.metrics_config["profile_directory"]
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{_slugify(job_name)}_{datetime.now().strftime('%Y%m%d-%H%M%S')}.prof")
+            profiler.dump_stats(path)
+            
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(20)
+            logging.info(f"Profilo del ciclo di '{job_name}' salvato in {path}\n{report.getvalue()}")
+    
+    def start_metrics(self):
+        # Endpoint HTTP opzionale e riepilogo JSON periodico
+        if self.metrics_config["enabled"]:
+            self.metrics_server = MetricsServer(self, self.metrics_config["host"], self.metrics_config["port"])
+            self.metrics_server.start()
+        
+        interval = self.metrics_config["summary_interval_seconds"]
+        if interval:
+            threading.Thread(target=self._summary_loop, args=(interval,), name="MetricsSummary", daemon=True).start()
+    
+    def _summary_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            summary = json.dumps(self.metrics.summary())
+            logging.info(f"Riepilogo metriche: {summary}")
+            
+            summary_file = self.metrics_config["summary_file"]
+            if summary_file:
+                try:
+                    with open(summary_file, "a") as f:
+                        f.write(summary + "\n")
+                except OSError as e:
+                    logging.error(f"Impossibile scrivere il riepilogo delle metriche: {e}")
+    
+    def _run_search_job(self, search_config):
+        # Un errore in una ricerca non deve fermare le altre
+        try:
+            return self.check_prices(search_config)
+        except Exception as e:
+            logging.error(f"Errore durante il controllo di '{search_config['product_name']}': {e}")
+            return []
+    
+    def _run_sold_recheck(self):
+        try:
+            return self.sold_verifier.recheck()
+        except Exception as e:
+            logging.error(f"Errore durante il ricontrollo degli annunci venduti: {e}")
+            return 0
     
     def setup_scheduler(self):
-        for search_config in self.config["searches"]:
-            interval_minutes = search_config.get("check_interval_minutes", 30)
+        self.scheduler = SearchScheduler(
+            max_workers=self.scheduler_config["max_workers"],
+            on_dispatch=lambda name, lag: self.metrics.observe("subito_schedule_lag_seconds", lag, search=name)
+        )
+        jitter_seconds = self.scheduler_config["jitter_seconds"]
+        
+        for name, interval_minutes, func in self._search_jobs():
+            # Sfasamento casuale per non avviare insieme le ricerche con lo stesso intervallo
+            first_delay = random.uniform(0, jitter_seconds) if jitter_seconds else 0
             
-            # Configura il job di pianificazione
-            schedule.every(interval_minutes).minutes.do(
-                self.check_prices, search_config=search_config
-            )
+            # Configura il job di pianificazione, il primo controllo parte subito
+            self.scheduler.add_job(name, interval_minutes * 60, func, first_delay=first_delay)
             
-            logging.info(f"Pianificato controllo ogni {interval_minutes} minuti per '{search_config['product_name']}'")
+            logging.info(f"Pianificato controllo ogni {interval_minutes} minuti per '{name}'")
+        
+        # Ricontrollo periodico degli annunci venduti, a partire dal primo intervallo
+        if self.sold_verifier:
+            interval_seconds = self.sold_verifier.recheck_interval_seconds
+            self.scheduler.add_job("sold-recheck", interval_seconds, self._run_sold_recheck, first_delay=interval_seconds)
+            logging.info(f"Pianificato ricontrollo degli annunci venduti ogni {interval_seconds / 60:g} minuti")
     
     def run(self):
         logging.info("Avvio del monitor dei prezzi di Subito.it")
         
-        # Esegui il primo controllo immediatamente
-        self.run_scheduled_check()
-        
         # Configura la pianificazione
         self.setup_scheduler()
+        self.start_metrics()
         
         # Loop principale
         try:
-            while True:
-                schedule.run_pending()
-                time.sleep(1)
+            self.scheduler.run_forever()
         except KeyboardInterrupt:
             logging.info("Monitor dei prezzi interrotto dall'utente")
+        finally:
+            self.scheduler.stop()
+            if self.metrics_server:
+                self.metrics_server.stop()
+            if self.snapshots:
+                self.snapshots.flush()
+            if self.notifier:
+                self.notifier.close()
+            if self.sold_verifier:
+                self.sold_verifier.close()
+            if self.parse_pool:
+                self.parse_pool.shutdown(cancel_futures=True)
+            if self.store:
+                self.store.close()
+
+# Funzione per ottenere l'URL di una specifica pagina dei risultati
+def build_page_url(search_url, page):
+    if page <= 1:
+        return search_url
+    
+    # Aggiungi il parametro della pagina all'URL
+    if '?' in search_url:
+        return f"{search_url}&o={page}"
+    return f"{search_url}?o={page}"
+
+# Interpreta l'header Retry-After (secondi o data HTTP) e restituisce i secondi di attesa
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+# Normalizza l'URL di una pagina per usarlo come chiave di cache
+def normalize_page_url(url):
+    parsed = urlparse(url)
+    params = [(key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True) if not (key == 'o' and value == '1')]
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), parsed.path or '/', '', urlencode(sorted(params)), ''))
+
+# Identificativo di una ricerca per lo stato che la riguarda (database, statistiche, notifiche)
+def search_key(search_config):
+    return search_config.get("id") or search_config["product_name"]
+
+# Assegna un id alle ricerche che condividono il nome del prodotto: il nome seguito
+# dalla fascia di prezzo, e da un numero progressivo se anche questa coincide
+def assign_search_ids(searches):
+    names = Counter(search_config["product_name"] for search_config in searches if not search_config.get("id"))
+    used = {search_config["id"] for search_config in searches if search_config.get("id")}
+    for search_config in searches:
+        name = search_config["product_name"]
+        if search_config.get("id") or names[name] < 2:
+            continue
+        search_id = f"{name} (€{search_config.get('min_price', 0)}-€{search_config['max_price']})"
+        suffix = 2
+        while search_id in used:
+            search_id = f"{name} (€{search_config.get('min_price', 0)}-€{search_config['max_price']}) #{suffix}"
+            suffix += 1
+        search_config["id"] = search_id
+        used.add(search_id)
+    return searches
 
 # Funzione per creare URL di ricerca ottimizzati per Subito.it
 def create_search_url(product_name, category=None, region=None):
@@ -454,6 +3163,67 @@ def create_search_url(product_name, category=None, region=None):
     
     return search_url
 
+# Esegue di nuovo _parse_products sulle pagine salvate nell'archivio
+def replay_snapshots(directory, product_name=None):
+    if not os.path.isdir(directory):
+        print(f"Archivio '{directory}' non trovato")
+        return
+    
+    monitor = PriceMonitor()
+    monitor.snapshots = None  # Non archiviare di nuovo le pagine durante la rianalisi
+    archive = SnapshotArchive(directory)
+    
+    # Le pagine vengono lette a blocchi; con il pool di parsing attivo ogni blocco è analizzato in parallelo
+    count = 0
+    snapshots = archive.iter_snapshots(product_name)
+    try:
+        while True:
+            batch = list(itertools.islice(snapshots, 64))
+            if not batch:
+                break
+            
+            pages = [(html_content, product_name or search.replace('-', ' '), page) for search, page, _, html_content in batch]
+            for (_, page, timestamp, _), (_, search_name, _), products in zip(batch, pages, monitor.parse_many(pages)):
+                print(f"{timestamp} - '{search_name}' pagina {page}: {len(products)} prodotti")
+            count += len(batch)
+    finally:
+        if monitor.parse_pool:
+            monitor.parse_pool.shutdown()
+    
+    print(f"Rianalizzate {count} pagine da '{directory}'")
+
+# Legge la configurazione senza crearla, per i comandi che non avviano il monitor
+def read_config():
+    if not os.path.exists(CONFIG_FILE):
+        return {}
+    try:
+        with open(CONFIG_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def show_market_stats(product_name, days=30):
+    if price_analytics is None:
+        print("Errore: le statistiche di mercato richiedono numpy")
+        return
+    
+    config = read_config()
+    db_file = config.get("database", {}).get("file", "price_history.db")
+    if not os.path.exists(db_file):
+        print(f"Database '{db_file}' non trovato")
+        return
+    
+    # Crea gli aggregati mancanti (database di versioni precedenti) prima di leggerli
+    store = PriceStore(db_file, history_days=0)
+    store.run_in_writer(price_analytics.backfill_daily_stats)
+    store.close()
+    
+    analytics_config = {**DEFAULT_ANALYTICS_CONFIG, **config.get("analytics", {})}
+    start = time.perf_counter()
+    report = price_analytics.market_report(db_file, product_name, days=days, rolling_days=analytics_config["window_days"])
+    print(price_analytics.format_report(report))
+    print(f"Report calcolato in {time.perf_counter() - start:.3f}s")
+
 # Funzione principale
 def main():
     import sys
@@ -463,6 +3233,7 @@ def main():
     parser.add_argument('--test', action='store_true', help='Esegui in modalità test')
     parser.add_argument('--url', help='URL da testare in modalità test')
     parser.add_argument('--product', help='Nome del prodotto da cercare')
+    parser.add_argument('--all', action='store_true', help='Monitora tutte le ricerche configurate in config.json')
     parser.add_argument('--min', type=float, help='Prezzo minimo')
     parser.add_argument('--max', type=float, help='Prezzo massimo')
     parser.add_argument('--category', help='Categoria (es. elettronica, arredamento)')
@@ -470,8 +3241,23 @@ def main():
     parser.add_argument('--interval', type=int, default=30, help='Intervallo di controllo in minuti')
     parser.add_argument('--limit', type=int, default=50, help='Numero massimo di risultati da mostrare')
     parser.add_argument('--pages', type=int, default=3, help='Numero di pagine da controllare')
+    parser.add_argument('--profile', action='store_true', help='Profila il primo ciclo di ogni ricerca con cProfile')
+    parser.add_argument('--replay', nargs='?', const=DEFAULT_SNAPSHOT_CONFIG["directory"], metavar='DIRECTORY', help="Rianalizza le pagine salvate nell'archivio")
+    parser.add_argument('--stats', metavar='NOME_PRODOTTO', help='Mostra le statistiche di mercato di una ricerca')
+    parser.add_argument('--days', type=int, default=30, help='Giorni considerati da --stats')
 
     args = parser.parse_args()
+    setup_logging(read_config().get("logging"))
+    
+    # Statistiche di mercato dal database dei prezzi
+    if args.stats:
+        show_market_stats(args.stats, args.days)
+        return
+    
+    # Rianalisi delle pagine archiviate
+    if args.replay:
+        replay_snapshots(args.replay, args.product)
+        return
     
     # Modalità test
     if args.test:
@@ -483,12 +3269,10 @@ def main():
             test_url = "https://www.subito.it/annunci-italia/vendita/usato/?q=televisione"
         
         monitor = PriceMonitor()
-        html_content = monitor._get_page_content(test_url)
+        product_name = args.product or "test"
+        products = monitor._load_page_products(test_url, product_name)
         
-        if html_content:
-            product_name = args.product or "test"
-            products = monitor._parse_products(html_content, product_name)
-            
+        if products is not None:
             print(f"\nRisultati del test per '{test_url}':")
             print(f"Trovati {len(products)} prodotti")
             print("-" * 80)
@@ -501,8 +3285,18 @@ def main():
         
         return
     
-    # Normale funzionamento
-    if args.product and args.max:
+    # Normale funzionamento: tutte le ricerche di config.json, oppure la sola ricerca indicata
+    if args.all:
+        monitor = PriceMonitor()
+        searches = monitor.config.get("searches", [])
+        if not searches:
+            print(f"Errore: nessuna ricerca configurata in {CONFIG_FILE}")
+            return
+        
+        print(f"Avvio monitoraggio di {len(searches)} ricerche da {CONFIG_FILE}")
+        for search_config in searches:
+            print(f"  - {search_key(search_config)}: €{search_config.get('min_price', 0)}-€{search_config['max_price']}")
+    elif args.product and args.max:
         monitor = PriceMonitor()
         
         min_price = args.min if args.min is not None else 0
@@ -539,12 +3333,22 @@ def main():
         print(f"Avvio monitoraggio per '{args.product}' con prezzo tra €{min_price} e €{max_price}")
         print(f"URL di ricerca: {search_url}")
         print(f"Controllo ogni {args.interval} minuti su {args.pages} pagine")
-        
-        # Avvia il monitoraggio
-        monitor.run()
     else:
         print("Usage: python3 botSubito.py --product NOME_PRODOTTO --min PREZZO_MIN --max PREZZO_MAX [--category CATEGORIA] [--region REGIONE] [--interval MINUTI] [--limit NUM_RISULTATI] [--pages NUM_PAGINE]")
+        print("  oppure: python3 botSubito.py --all")
         print("  oppure: python3 botSubito.py --test [--url URL_DA_TESTARE]")
+        print("  oppure: python3 botSubito.py --replay [DIRECTORY_ARCHIVIO] [--product NOME_PRODOTTO]")
+        print("  oppure: python3 botSubito.py --stats NOME_PRODOTTO [--days GIORNI]")
+        return
+    
+    # Profilazione su richiesta: --profile o segnale SIGUSR1 durante l'esecuzione
+    if args.profile:
+        monitor.request_profile()
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: monitor.request_profile())
+    
+    # Avvia il monitoraggio
+    monitor.run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,204 @@
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Percentili salvati nelle statistiche giornaliere e mostrati nei report
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# Prezzi degli annunci osservati a partire da since, da una mappa ID -> (prezzo, timestamp)
+def latest_prices(latest, since):
+    return np.fromiter((price for price, timestamp in latest.values() if timestamp >= since), dtype=float)
+
+def summarize(prices):
+    if not len(prices):
+        return None
+    values = np.percentile(prices, PERCENTILES)
+    return {
+        "listings": int(len(prices)),
+        "mean": float(prices.mean()),
+        **{f"p{q}": float(value) for q, value in zip(PERCENTILES, values)}
+    }
+
+# Quota degli annunci con prezzo più alto (a parità conta la metà): 1 è il più economico
+def deal_score(sorted_prices, price):
+    count = len(sorted_prices)
+    if not count:
+        return None
+    left = np.searchsorted(sorted_prices, price, side="left")
+    right = np.searchsorted(sorted_prices, price, side="right")
+    return float((count - right + (right - left) / 2) / count)
+
+# Mediana mobile: i primi valori usano la finestra disponibile
+def rolling_median(values, window):
+    values = np.asarray(values, dtype=float)
+    if window <= 1 or not len(values):
+        return values
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    return np.nanmedian(sliding_window_view(padded, window), axis=1)
+
+def write_daily_stats(conn, search_query, day, stats):
+    conn.execute("""
+        INSERT OR REPLACE INTO search_daily_stats (search_query, day, listings, mean, p10, p25, p50, p75, p90)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (search_query, day, stats["listings"], stats["mean"], stats["p10"], stats["p25"], stats["p50"], stats["p75"], stats["p90"]))
+
+# Ricostruisce una sola volta le statistiche giornaliere dallo storico esistente
+def backfill_daily_stats(conn):
+    if conn.execute("SELECT 1 FROM search_daily_stats LIMIT 1").fetchone():
+        return
+
+    rows = conn.execute("""
+        SELECT COALESCE(h.search_query, p.search_query), substr(h.timestamp, 1, 10), h.product_id, h.price
+        FROM price_history h JOIN products p ON p.id = h.product_id
+        ORDER BY 1, 2, h.timestamp
+    """)
+    days = 0
+    for (search_query, day), group in itertools.groupby(rows, key=lambda row: (row[0], row[1])):
+        last = {product_id: price for _, _, product_id, price in group}
+        write_daily_stats(conn, search_query, day, summarize(np.fromiter(last.values(), dtype=float, count=len(last))))
+        days += 1
+
+    if days:
+        logging.info(f"Ricostruite {days} statistiche giornaliere dallo storico dei prezzi")
+
+# Distribuzione dei prezzi di ogni ricerca, aggiornata dopo ogni ciclo con i
+# prezzi appena osservati. Per ogni ricerca resta in memoria solo l'ultimo
+# prezzo di ogni annuncio, caricato dallo storico del PriceStore al primo ciclo.
+# Le statistiche del giorno vengono salvate dal thread di scrittura del database.
+class MarketAnalytics:
+    def __init__(self, store, window_days=7, min_listings=10):
+        self.store = store
+        self.window_days = window_days
+        self.min_listings = min_listings
+        self._lock = threading.Lock()
+        self._distributions = {}
+        self._latest = {}    # ricerca -> {ID annuncio: (ultimo prezzo, timestamp)}
+
+        store.run_in_writer(backfill_daily_stats)
+
+    def _latest_for(self, search_query):
+        with self._lock:
+            latest = self._latest.get(search_query)
+            if latest is not None:
+                return latest
+            latest = self._latest[search_query] = {}
+
+        history = self.store.history(search_query)
+        if history is not None:
+            products, prices, timestamps, ids = history.columns()
+            for index, price, timestamp in zip(products, prices, timestamps):
+                latest[ids[index]] = (price, timestamp)
+        return latest
+
+    def refresh(self, search_query, prices, timestamp=None):
+        # prices: coppie (ID annuncio, prezzo) osservate nel ciclo appena concluso
+        timestamp = timestamp or time.time()
+        latest = self._latest_for(search_query)
+        for product_id, price in prices:
+            latest[product_id] = (price, timestamp)
+        if not latest:
+            return
+
+        # Gli annunci non più visti escono sia dalla finestra sia dal giorno corrente
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        since = timestamp - self.window_days * 86400
+        cutoff = min(since, today.timestamp())
+        for product_id in [product_id for product_id, (_, seen) in latest.items() if seen < cutoff]:
+            del latest[product_id]
+
+        window = np.sort(latest_prices(latest, since))
+        with self._lock:
+            self._distributions[search_query] = window
+
+        stats = summarize(latest_prices(latest, today.timestamp()))
+        if stats:
+            day = today.date().isoformat()
+            self.store.run_in_writer(lambda conn: write_daily_stats(conn, search_query, day, stats))
+
+    def deal_score(self, search_query, price):
+        with self._lock:
+            distribution = self._distributions.get(search_query)
+        if distribution is None or len(distribution) < self.min_listings:
+            return None
+        return deal_score(distribution, price)
+
+# Report di mercato di una ricerca letto dalle tabelle aggregate, senza
+# scorrere price_history
+def market_report(db_file, search_query, days=30, rolling_days=7, top=5):
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        cutoff = datetime.now() - timedelta(days=days)
+        rows = conn.execute("""
+            SELECT s.first_price, s.last_price, s.first_seen, p.title, p.link
+            FROM product_stats s JOIN products p ON p.id = s.product_id
+            WHERE s.search_query = ? AND s.last_seen >= ?
+        """, (search_query, cutoff.isoformat())).fetchall()
+        daily = conn.execute("""
+            SELECT day, listings, p50 FROM search_daily_stats
+            WHERE search_query = ? AND day >= ? ORDER BY day
+        """, (search_query, cutoff.date().isoformat())).fetchall()
+    finally:
+        conn.close()
+
+    report = {"search": search_query, "days": days, "stats": None, "daily": [], "drops": [], "deals": []}
+    if not rows:
+        return report
+
+    first_prices = np.fromiter((row[0] for row in rows), dtype=float, count=len(rows))
+    last_prices = np.fromiter((row[1] for row in rows), dtype=float, count=len(rows))
+    report["stats"] = summarize(last_prices)
+
+    if daily:
+        medians = rolling_median([row[2] for row in daily], rolling_days)
+        report["daily"] = [
+            {"day": day, "listings": listings, "median": median, "rolling_median": float(rolling)}
+            for (day, listings, median), rolling in zip(daily, medians)
+        ]
+
+    # Ribassi maggiori rispetto al primo prezzo osservato
+    deltas = last_prices - first_prices
+    for index in np.argsort(deltas)[:top]:
+        if deltas[index] >= 0:
+            break
+        _, _, _, title, link = rows[index]
+        report["drops"].append({"title": title, "link": link, "first_price": float(first_prices[index]), "price": float(last_prices[index]), "delta": float(deltas[index])})
+
+    # Annunci comparsi nelle ultime 24 ore, ordinati per convenienza rispetto alla distribuzione
+    distribution = np.sort(last_prices)
+    recent = (datetime.now() - timedelta(days=1)).isoformat()
+    new_listings = [index for index, row in enumerate(rows) if row[2] >= recent]
+    scores = [(deal_score(distribution, last_prices[index]), index) for index in new_listings]
+    for score, index in sorted(scores, reverse=True)[:top]:
+        _, _, _, title, link = rows[index]
+        report["deals"].append({"title": title, "link": link, "price": float(last_prices[index]), "deal_score": round(score, 3)})
+
+    return report
+
+def format_report(report):
+    stats = report["stats"]
+    if not stats:
+        return f"Nessun dato per '{report['search']}' negli ultimi {report['days']} giorni"
+
+    lines = [
+        f"Mercato di '{report['search']}' negli ultimi {report['days']} giorni: {stats['listings']} annunci",
+        f"  media €{stats['mean']:.2f} - " + ", ".join(f"p{q} €{stats[f'p{q}']:.2f}" for q in PERCENTILES)
+    ]
+    if report["daily"]:
+        lines.append("  Mediana giornaliera (mobile):")
+        for row in report["daily"]:
+            lines.append(f"    {row['day']}: €{row['median']:.2f} (€{row['rolling_median']:.2f}) su {row['listings']} annunci")
+    if report["drops"]:
+        lines.append("  Ribassi maggiori:")
+        for drop in report["drops"]:
+            lines.append(f"    {drop['title']}: €{drop['first_price']:.2f} -> €{drop['price']:.2f} ({drop['delta']:+.2f})")
+    if report["deals"]:
+        lines.append("  Nuovi annunci più convenienti:")
+        for deal in report["deals"]:
+            lines.append(f"    {deal['title']}: €{deal['price']:.2f} (punteggio {deal['deal_score']:.2f})")
+    return "\n".join(lines)
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+# I test importano i moduli e le pagine salvate dalla radice del repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark import benchmark_config, load_corpus
+from botSubito import PriceMonitor
+
+@pytest.fixture(scope="session")
+def corpus():
+    return load_corpus([os.path.join(ROOT, "test_page.html")])
+
+# Crea monitor con la configurazione isolata del benchmark; le sezioni passate
+# vengono unite a quelle predefinite e gli archivi aperti vengono chiusi a fine test
+@pytest.fixture
+def make_monitor():
+    monitors = []
+
+    def make(**sections):
+        config = benchmark_config()
+        config["output"] = {"console": False, "jsonl_file": None}
+        config["notification"] = {"enabled": False}
+        for name, values in sections.items():
+            config[name] = {**config.get(name, {}), **values}
+        monitor = PriceMonitor(config)
+        monitors.append(monitor)
+        return monitor
+
+    yield make
+
+    for monitor in monitors:
+        if monitor.store:
+            monitor.store.flush()
+            monitor.store.close()
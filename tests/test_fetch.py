@@ -0,0 +1,46 @@
+import time
+
+from benchmark import StandInServer
+
+SEARCH_PATH = "/annunci-italia/vendita/usato/?q=iphone"
+
+def fetch(monitor, server):
+    start = time.monotonic()
+    html_content = monitor._get_page_content(server.base_url + SEARCH_PATH)
+    return html_content, time.monotonic() - start
+
+def test_retries_transient_errors(corpus, make_monitor):
+    monitor = make_monitor(rate_limit={"max_retries": 3})
+    with StandInServer(corpus, fail_first=2) as server:
+        html_content, _ = fetch(monitor, server)
+
+    assert html_content == corpus[0][1]
+    assert server.requests == 3
+    assert monitor.metrics.summary()["counters"]["subito_fetch_responses_total{status=\"503\"}"] == 2
+
+def test_gives_up_after_max_retries(corpus, make_monitor):
+    monitor = make_monitor(rate_limit={"max_retries": 2})
+    with StandInServer(corpus, error_rate=1.0) as server:
+        html_content, _ = fetch(monitor, server)
+
+    assert html_content is None
+    assert server.requests == 3
+
+def test_waits_for_retry_after(corpus, make_monitor):
+    # Il backoff esponenziale sarebbe quasi nullo: l'attesa viene dal server
+    monitor = make_monitor(rate_limit={"backoff_base": 0.001, "backoff_max": 5.0})
+    with StandInServer(corpus, fail_first=1, error_status=429, retry_after=1) as server:
+        html_content, elapsed = fetch(monitor, server)
+
+    assert html_content == corpus[0][1]
+    assert server.requests == 2
+    assert 1.0 <= elapsed < 3.0
+
+def test_caps_retry_after_at_backoff_max(corpus, make_monitor):
+    monitor = make_monitor(rate_limit={"backoff_max": 0.2})
+    with StandInServer(corpus, fail_first=1, error_status=429, retry_after=120) as server:
+        html_content, elapsed = fetch(monitor, server)
+
+    assert html_content == corpus[0][1]
+    assert server.requests == 2
+    assert elapsed < 2.0
@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+from benchmark import StandInServer
+
+PAGES = 4
+
+# Corpus con annunci diversi su ogni pagina: il numero dell'annuncio nei link
+# viene spostato in base alla pagina
+@pytest.fixture
+def paged_corpus(corpus):
+    path, html_content = corpus[0]
+    shift = lambda page: lambda match: f"-{int(match.group(1)) + page * 1000}.htm"
+    return [(path, re.sub(r"-(\d{9})\.htm", shift(page), html_content)) for page in range(PAGES)]
+
+def run_cycles(monitor, server, cycles):
+    search_config = {
+        "product_name": "iphone",
+        "search_url": f"{server.base_url}/annunci-italia/vendita/usato/?q=iphone",
+        "min_price": 0,
+        "max_price": 1000000,
+        "pages_to_check": PAGES
+    }
+    requests = []
+    for _ in range(cycles):
+        before = server.requests
+        monitor.check_prices(search_config)
+        requests.append(server.requests - before)
+    return requests
+
+def make_incremental_monitor(make_monitor, tmp_path, **incremental):
+    return make_monitor(
+        database={"enabled": True, "file": str(tmp_path / "prices.db")},
+        incremental={"enabled": True, **incremental}
+    )
+
+def test_stops_after_first_page_without_new_listings(paged_corpus, make_monitor, tmp_path):
+    monitor = make_incremental_monitor(make_monitor, tmp_path, full_sweep_every=10)
+    with StandInServer(paged_corpus) as server:
+        assert run_cycles(monitor, server, 3) == [PAGES, 1, 1]
+
+def test_full_sweep_every_n_cycles(paged_corpus, make_monitor, tmp_path):
+    monitor = make_incremental_monitor(make_monitor, tmp_path, full_sweep_every=3)
+    with StandInServer(paged_corpus) as server:
+        assert run_cycles(monitor, server, 4) == [PAGES, 1, 1, PAGES]
+
+def test_restart_resumes_from_the_database(paged_corpus, make_monitor, tmp_path):
+    with StandInServer(paged_corpus) as server:
+        first = make_incremental_monitor(make_monitor, tmp_path, full_sweep_every=10)
+        run_cycles(first, server, 1)
+        first.store.flush()
+
+        # Un nuovo monitor sullo stesso database riconosce subito gli annunci già visti
+        second = make_incremental_monitor(make_monitor, tmp_path, full_sweep_every=10)
+        assert run_cycles(second, server, 1) == [1]
+
+def test_disabled_scans_every_page(paged_corpus, make_monitor, tmp_path):
+    monitor = make_monitor(database={"enabled": True, "file": str(tmp_path / "prices.db")})
+    with StandInServer(paged_corpus) as server:
+        assert run_cycles(monitor, server, 2) == [PAGES, PAGES]
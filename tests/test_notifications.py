@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from botSubito import Metrics, NotificationDispatcher, NotificationError, NotifierSink, PageParser, PriceStore, StoreSink
+
+# Canale finto: registra i messaggi e fallisce con gli errori preparati dal test
+class RecordingChannel:
+    name = "recording"
+    max_length = 4000
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.attempts = 0
+        self.messages = []
+        self._lock = threading.Lock()
+
+    def send(self, text):
+        with self._lock:
+            self.attempts += 1
+            if self.errors:
+                raise self.errors.pop(0)
+            self.messages.append(text)
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def listings(corpus):
+    return PageParser("html.parser").parse(corpus[0][1], None)["products"][:4]
+
+def make_dispatcher(channel, delivered, **config):
+    config = {"batch_window_seconds": 0.2, "backoff_base": 0.01, "backoff_max": 0.05, **config}
+    on_delivered = lambda search, ids: delivered.append((search, sorted(ids)))
+    return NotificationDispatcher([channel], config, on_delivered=on_delivered, metrics=Metrics())
+
+def test_batches_one_message_per_search(listings):
+    channel = RecordingChannel()
+    delivered = []
+    dispatcher = make_dispatcher(channel, delivered)
+
+    first, second, third, other = listings
+    dispatcher.submit("iphone", [(first, None)])
+    dispatcher.submit("iphone", [(second, None), (first, None)])
+    dispatcher.submit("iphone", [(third, 500.0)])
+    dispatcher.submit("macbook", [(other, None)])
+    dispatcher.flush()
+    dispatcher.close()
+
+    assert len(channel.messages) == 2
+    iphone_message = next(message for message in channel.messages if "'iphone'" in message)
+    assert iphone_message.startswith("🔔 3 risultati per 'iphone'")
+    assert "(prima €500.0)" in iphone_message
+    assert sorted(delivered) == [
+        ("iphone", sorted([first['id'], second['id'], third['id']])),
+        ("macbook", [other['id']])
+    ]
+
+def test_retries_retryable_errors(listings):
+    channel = RecordingChannel([NotificationError("503"), NotificationError("429", retry_after=0.01)])
+    delivered = []
+    dispatcher = make_dispatcher(channel, delivered)
+
+    dispatcher.submit("iphone", [(listings[0], None)])
+    dispatcher.flush()
+    dispatcher.close()
+
+    assert channel.attempts == 3
+    assert len(channel.messages) == 1
+    assert delivered == [("iphone", [listings[0]['id']])]
+    assert dispatcher.metrics.summary()["counters"]["subito_notifications_sent_total{channel=\"recording\"}"] == 1
+
+def test_does_not_retry_permanent_errors(listings):
+    channel = RecordingChannel([NotificationError("destinatario rifiutato", retryable=False)])
+    delivered = []
+    dispatcher = make_dispatcher(channel, delivered)
+
+    dispatcher.submit("iphone", [(listings[0], None)])
+    dispatcher.flush()
+    dispatcher.close()
+
+    assert channel.attempts == 1
+    assert delivered == []
+    assert dispatcher.metrics.summary()["counters"]["subito_notifications_failed_total{channel=\"recording\"}"] == 1
+
+def test_resends_undelivered_listings_on_next_cycle(listings, tmp_path):
+    store = PriceStore(str(tmp_path / "prices.db"))
+    channel = RecordingChannel([NotificationError("down", retryable=False)])
+    dispatcher = make_dispatcher(channel, [], max_retries=0)
+    dispatcher.on_delivered = store.mark_notified
+
+    def cycle():
+        store_sink = StoreSink(store, "iphone")
+        notifier_sink = NotifierSink(dispatcher, "iphone", store)
+        for product in listings[:2]:
+            notifier_sink.emit(product, store_sink.emit(product))
+        store_sink.close()
+        dispatcher.flush()
+
+    try:
+        cycle()
+        assert channel.messages == []
+
+        # Al ciclo successivo gli annunci non sono più nuovi, ma non sono mai stati consegnati
+        cycle()
+        assert len(channel.messages) == 1
+        assert all(store.is_notified("iphone", product['id']) for product in listings[:2])
+
+        cycle()
+        assert len(channel.messages) == 1
+    finally:
+        dispatcher.close()
+        store.flush()
+        store.close()
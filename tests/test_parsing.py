@@ -0,0 +1,47 @@
+import pytest
+
+from benchmark import StandInServer
+from botSubito import PageParser
+
+# Campi che il JSON incorporato e le card HTML devono restituire uguali;
+# immagine e località sono formattate in modo diverso nei due percorsi
+SHARED_FIELDS = ("id", "title", "price", "link")
+
+@pytest.fixture
+def page_html(corpus, make_monitor):
+    # La pagina arriva dal server locale, come durante una scansione
+    monitor = make_monitor()
+    with StandInServer(corpus) as server:
+        html_content = monitor._get_page_content(f"{server.base_url}/annunci-italia/vendita/usato/?q=iphone")
+    assert html_content
+    return html_content
+
+def shared_fields(products):
+    return [tuple(product[field] for field in SHARED_FIELDS) for product in products]
+
+@pytest.mark.parametrize("product_name", [None, "iphone"])
+def test_embedded_json_matches_dom(page_html, product_name):
+    json_result = PageParser("html.parser", embedded_json=True).parse(page_html, product_name)
+    dom_result = PageParser("html.parser", embedded_json=False).parse(page_html, product_name)
+
+    assert json_result["path"] == "json"
+    assert dom_result["path"] == "dom"
+    assert json_result["products"]
+    assert shared_fields(json_result["products"]) == shared_fields(dom_result["products"])
+
+@pytest.mark.parametrize("embedded_json", [True, False])
+def test_lxml_matches_html_parser(page_html, embedded_json):
+    pytest.importorskip("lxml")
+    lxml_result = PageParser("lxml", embedded_json).parse(page_html, "iphone")
+    builtin_result = PageParser("html.parser", embedded_json).parse(page_html, "iphone")
+
+    assert lxml_result["products"]
+    assert [dict(product) for product in lxml_result["products"]] == [dict(product) for product in builtin_result["products"]]
+
+def test_parse_many_matches_page_parser(page_html, make_monitor):
+    monitor = make_monitor(parser={"embedded_json": False})
+    expected = monitor.page_parser.parse(page_html, "iphone")["products"]
+
+    products, = monitor.parse_many([(page_html, "iphone", 1)])
+
+    assert [dict(product) for product in products] == [dict(product) for product in expected]